@@ -0,0 +1,64 @@
+import base64
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from utils.config import settings
+
+
+def clamp_limit(limit):
+    if limit is None:
+        return settings.PAGE_DEFAULT_LIMIT
+    return max(1, min(int(limit), settings.PAGE_MAX_LIMIT))
+
+
+def encode_cursor(key, row_id):
+    """Opaque cursor for the last row of a page: its sort key (datetime or int) and id."""
+    raw = f"{key.isoformat() if isinstance(key, datetime) else key}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, key_type=datetime):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        key, row_id = raw.rsplit("|", 1)
+        key = datetime.fromisoformat(key) if key_type is datetime else key_type(key)
+        return key, int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
+def after_cursor(query, key_col, id_col, cursor, descending=True, key_type=datetime):
+    """
+    Keyset page: order by (key, id) and continue strictly after the cursor row, so paging
+    stays O(limit) on the composite index however deep the client goes.
+    """
+    if cursor:
+        key, row_id = decode_cursor(cursor, key_type)
+        if descending:
+            query = query.filter(or_(key_col < key, and_(key_col == key, id_col < row_id)))
+        else:
+            query = query.filter(or_(key_col > key, and_(key_col == key, id_col > row_id)))
+    if descending:
+        return query.order_by(key_col.desc(), id_col.desc())
+    return query.order_by(key_col.asc(), id_col.asc())
+
+
+def prefix_filter(query, col, prefix):
+    """Plate prefix as a range (col >= 'AB' and col < 'AC'), which a plain btree index serves on every backend."""
+    prefix = (prefix or "").upper().strip()
+    if not prefix:
+        return query
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return query.filter(col >= prefix, col < upper)
+
+
+def page(query, limit, key_of, response):
+    """
+    Fetch limit + 1 rows to know whether there is a next page; the cursor for it goes in
+    the X-Next-Cursor response header so the body stays a plain list.
+    """
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(key_of(rows[-1]), rows[-1].id)
+    return rows
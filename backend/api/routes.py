@@ -1,4 +1,6 @@
-from fastapi import APIRouter, Depends, UploadFile, File, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks, Response, Request, Header, WebSocket, WebSocketDisconnect
+import json
+from datetime import datetime, timedelta
 from pydantic import BaseModel
 from typing import Optional, List
 from models.residents import Resident
@@ -6,12 +8,17 @@ from models.owner_cache import OwnerCache
 from models.sessions import AccessSession
 from models.detections import Detection
 from models.base import SessionLocal
-from detection.detector import PlateDetector
-from detection.ocr import ocr_image
-from detection.session_manager import process_detection, sweep_sessions
+from api.pagination import clamp_limit, after_cursor, prefix_filter, page
+from detection.ingest import run_blocking, ingest_upload, ingest_batch
+from detection.session_manager import residents
+from detection.scheduler import sweeper
+from detection.events import bus
+from detection.image_store import image_key, read_image, read_thumbnail
+from detection import rollups
+from sqlalchemy import func
 from utils.logger import get_logger
 from utils.config import settings
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 
 router = APIRouter()
 logger = get_logger()
@@ -37,8 +44,6 @@ class ResidentIn(BaseModel):
     notes: Optional[str] = None
 
 # start / stop detection (naive)
-detector = PlateDetector()
-
 @router.post("/start_detection")
 def start_detection():
     # In a container environment, detection runs as a separate process or a CLI.
@@ -49,17 +54,71 @@ def stop_detection():
     return {"status":"stopped"}
 
 @router.get("/sessions")
-def list_sessions(active_only: Optional[bool] = False, db=Depends(get_db)):
-    q = db.query(AccessSession)
+def list_sessions(response: Response, active_only: Optional[bool] = False, status: Optional[str] = None, category: Optional[str] = None, plate: Optional[str] = None,
+                  camera_id: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                  limit: Optional[int] = None, cursor: Optional[str] = None, db=Depends(get_db)):
+    """
+    Newest first by last_seen. Filters: status (active_only is status=active), category
+    (resident | visitor), plate prefix,
+    camera (sessions with a detection from it), last_seen range. Follow X-Next-Cursor for more.
+    """
+    q = db.query(AccessSession.id, AccessSession.plate_number, AccessSession.entry_time, AccessSession.last_seen,
+                 AccessSession.exit_time, AccessSession.status, AccessSession.category)
     if active_only:
-        q = q.filter(AccessSession.status == "active")
-    sessions = q.order_by(AccessSession.last_seen.desc()).limit(500).all()
-    return [{"id":s.id, "plate":s.plate_number, "entry_time":s.entry_time, "last_seen":s.last_seen, "exit_time":s.exit_time, "status":s.status} for s in sessions]
+        status = "active"
+    if status:
+        q = q.filter(AccessSession.status == status)
+    if category:
+        q = q.filter(AccessSession.category == category)
+    q = prefix_filter(q, AccessSession.plate_number, plate)
+    if camera_id:
+        q = q.filter(AccessSession.id.in_(db.query(Detection.session_id).filter(Detection.camera_id == camera_id)))
+    if since:
+        q = q.filter(AccessSession.last_seen >= since)
+    if until:
+        q = q.filter(AccessSession.last_seen < until)
+    q = after_cursor(q, AccessSession.last_seen, AccessSession.id, cursor)
+    rows = page(q, clamp_limit(limit), lambda r: r.last_seen, response)
+    return [{"id":s.id, "plate":s.plate_number, "entry_time":s.entry_time, "last_seen":s.last_seen, "exit_time":s.exit_time, "status":s.status, "category":s.category} for s in rows]
 
 @router.get("/detections")
-def list_detections(limit: int = 100, db=Depends(get_db)):
-    dets = db.query(Detection).order_by(Detection.timestamp.desc()).limit(limit).all()
-    return [{"id":d.id, "session_id": d.session_id, "timestamp": d.timestamp, "ocr_text": d.ocr_text, "confidence": d.detection_confidence, "image_path": d.image_path} for d in dets]
+def list_detections(response: Response, plate: Optional[str] = None, camera_id: Optional[str] = None, session_id: Optional[int] = None,
+                    since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    limit: Optional[int] = None, cursor: Optional[str] = None, db=Depends(get_db)):
+    """Newest first by timestamp; limit is capped at PAGE_MAX_LIMIT. Follow X-Next-Cursor for more."""
+    q = db.query(Detection.id, Detection.session_id, Detection.timestamp, Detection.ocr_text, Detection.detection_confidence,
+                 Detection.image_path)
+    q = prefix_filter(q, Detection.ocr_text, plate)
+    if camera_id:
+        q = q.filter(Detection.camera_id == camera_id)
+    if session_id is not None:
+        q = q.filter(Detection.session_id == session_id)
+    if since:
+        q = q.filter(Detection.timestamp >= since)
+    if until:
+        q = q.filter(Detection.timestamp < until)
+    q = after_cursor(q, Detection.timestamp, Detection.id, cursor)
+    rows = page(q, clamp_limit(limit), lambda d: d.timestamp, response)
+    return [{"id":d.id, "session_id": d.session_id, "timestamp": d.timestamp, "ocr_text": d.ocr_text, "confidence": d.detection_confidence,
+             "image_path": d.image_path, **_image_urls(d.image_path)} for d in rows]
+
+def _image_urls(image_path):
+    key = image_key(image_path)
+    if key is None:
+        return {"image_url": None, "thumb_url": None}
+    return {"image_url": f"/api/images/{key}", "thumb_url": f"/api/images/{key}?thumb=true"}
+
+@router.get("/images/{key:path}")
+def get_image(key: str, thumb: bool = False):
+    """
+    A stored crop (or its thumbnail) by storage key, whether still on disk or packed into its
+    day's archive by the retention job. Keys are content addressed, so responses never change.
+    """
+    try:
+        data, media_type = read_thumbnail(key) if thumb else read_image(key)
+    except (FileNotFoundError, ValueError):
+        raise HTTPException(status_code=404, detail="image not found")
+    return Response(data, media_type=media_type, headers={"Cache-Control": "public, max-age=31536000, immutable"})
 
 @router.post("/detections")
 async def receive_detection(payload: DetectionPayload):
@@ -69,44 +128,52 @@ async def receive_detection(payload: DetectionPayload):
     For simplicity we expect detection client to provide image as multipart file optionally.
     """
     # This simple POST receives JSON (ocr_text, confidence, camera_id), but detection client should call
-    # the session manager with the cropped image saved locally. For now we add minimal behavior:
-    sweep_sessions()  # update sessions
+    # the session manager with the cropped image saved locally. For now we add minimal behavior.
+    # Session expiry runs in the background scheduler (detection/scheduler.py).
     # If the detection client also posts image file: support that via another endpoint (below)
     return {"status":"ok", "received": payload.dict()}
 
 @router.post("/detections/upload")
-async def upload_detection(file: UploadFile = File(...), ocr_text: str = "", confidence: float = 0.6, camera_id: str = "cam0"):
-    # save uploaded file
-    path_dir = settings.STATIC_IMAGE_DIR
-    import os, time
-    os.makedirs(path_dir, exist_ok=True)
-    filename = f"{camera_id}_{ocr_text}_{int(time.time()*1000)}.jpg"
-    path = os.path.join(path_dir, filename)
-    with open(path, "wb") as f:
-        f.write(await file.read())
-
-    # call session manager with the saved image path -> open image and process
-    from PIL import Image
-    img = Image.open(path)
-    import numpy as np
-    arr = np.array(img)[:,:,::-1]  # to BGR
-    res = process_detection(ocr_text, arr, confidence, camera_id=camera_id)
+async def upload_detection(file: UploadFile = File(...), ocr_text: str = Form(""), confidence: float = Form(0.6), camera_id: str = Form("cam0")):
+    # only the body read happens on the event loop; storage, decode and DB work run on the ingest pool
+    data = await file.read()
+    try:
+        res = await run_blocking(ingest_upload, data, ocr_text, confidence, camera_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))  # not a decodable image
     return {"status":"ok", "result": res}
 
+@router.post("/detections/upload_batch")
+async def upload_detection_batch(files: List[UploadFile] = File(...), confidence: float = Form(0.6), camera_id: str = Form("cam0")):
+    """Upload several plate crops at once; they are OCR'd server-side in a single batch."""
+    blobs = [await f.read() for f in files]
+    try:
+        results = await run_blocking(ingest_batch, blobs, confidence, camera_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))  # not a decodable image
+    return {"status":"ok", "results": results}
+
 @router.post("/residents")
 def add_resident(r: ResidentIn, db=Depends(get_db)):
-    existing = db.query(Resident).filter(Resident.plate_number == r.plate_number).first()
+    # stored as detections store plates (upper case, trimmed), so ?plate= prefixes and lookups match
+    plate = r.plate_number.upper().strip()
+    existing = db.query(Resident).filter(Resident.plate_number == plate).first()
     if existing:
         return {"status":"exists"}
-    new = Resident(plate_number=r.plate_number, resident_name=r.resident_name, apartment_no=r.apartment_no, phone=r.phone, notes=r.notes)
+    new = Resident(plate_number=plate, resident_name=r.resident_name, apartment_no=r.apartment_no, phone=r.phone, notes=r.notes)
     db.add(new)
     db.commit()
+    residents.add(new.id, new.plate_number)
     return {"status":"ok", "id": new.id}
 
 @router.get("/residents")
-def list_residents(db=Depends(get_db)):
-    arr = db.query(Resident).all()
-    return [{"id":r.id,"plate_number":r.plate_number,"resident_name":r.resident_name,"apartment_no":r.apartment_no,"phone":r.phone} for r in arr]
+def list_residents(response: Response, plate: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None, db=Depends(get_db)):
+    """Ordered by plate number; follow X-Next-Cursor for more."""
+    q = db.query(Resident.id, Resident.plate_number, Resident.resident_name, Resident.apartment_no, Resident.phone)
+    q = prefix_filter(q, Resident.plate_number, plate)
+    q = after_cursor(q, Resident.plate_number, Resident.id, cursor, descending=False, key_type=str)
+    rows = page(q, clamp_limit(limit), lambda r: r.plate_number, response)
+    return [{"id":r.id,"plate_number":r.plate_number,"resident_name":r.resident_name,"apartment_no":r.apartment_no,"phone":r.phone} for r in rows]
 
 @router.post("/manual_lookup")
 def manual_lookup(plate: str):
@@ -116,23 +183,111 @@ def manual_lookup(plate: str):
 
 @router.get("/status")
 def status():
-    sweep_sessions()
-    return {"status":"ok"}
+    from detection.excise_lookup import lookup_stats
+    from detection.session_manager import owner_resolver, detection_writer
+    from detection.ocr import ocr_stats
+    from detection.retention import retention
+    return {"status":"ok", "sweeper": sweeper.stats(), "owner_lookup": lookup_stats(), "owner_queue": owner_resolver.stats(), "ocr": ocr_stats(), "events": bus.stats(), "residents": residents.stats(), "detection_writer": detection_writer.stats(), "crop_retention": retention.stats()}
+
+def _window(since, until, default):
+    until = until or datetime.utcnow()
+    return since or until - default, until
+
+@router.get("/analytics/occupancy")
+def occupancy(db=Depends(get_db)):
+    """Vehicles inside now (active sessions, by category) and today's entries/exits from the hourly rollup."""
+    rows = db.query(AccessSession.category, func.count(AccessSession.id)) \
+        .filter(AccessSession.status == "active").group_by(AccessSession.category).all()
+    by_category = {category or "visitor": n for category, n in rows}
+    now = datetime.utcnow()
+    today = rollups.traffic(db, now.replace(hour=0, minute=0, second=0, microsecond=0), now + timedelta(hours=1), bucket="day")
+    return {"inside": sum(by_category.values()), "by_category": by_category, "as_of": now,
+            "entries_today": today[0]["entries"] if today else 0, "exits_today": today[0]["exits"] if today else 0}
+
+@router.get("/analytics/traffic")
+def traffic(since: Optional[datetime] = None, until: Optional[datetime] = None, camera_id: Optional[str] = None,
+            category: Optional[str] = None, bucket: str = "hour", db=Depends(get_db)):
+    """Entries, exits and detections per hour (bucket=day for daily), oldest first; defaults to the last 24 hours."""
+    if bucket not in ("hour", "day"):
+        raise HTTPException(status_code=400, detail="bucket must be hour or day")
+    since, until = _window(since, until, timedelta(hours=24))
+    return rollups.traffic(db, since, until, camera_id, category, bucket)
+
+@router.get("/analytics/cameras")
+def traffic_by_camera(since: Optional[datetime] = None, until: Optional[datetime] = None, category: Optional[str] = None,
+                      db=Depends(get_db)):
+    """Entry/exit/detection totals per camera; defaults to the last 24 hours."""
+    since, until = _window(since, until, timedelta(hours=24))
+    return rollups.traffic_by_camera(db, since, until, category)
+
+@router.get("/analytics/dwell")
+def dwell(since: Optional[datetime] = None, until: Optional[datetime] = None, camera_id: Optional[str] = None,
+          category: Optional[str] = None, db=Depends(get_db)):
+    """Dwell-time histogram (last_seen - entry_time) of sessions that exited in the window; defaults to the last 7 days."""
+    since, until = _window(since, until, timedelta(days=7))
+    return rollups.dwell(db, since.date(), until.date(), camera_id, category)
+
+def _sse(event):
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+@router.get("/events")
+async def stream_events(request: Request, last_event_id: Optional[int] = None, last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")):
+    """
+    Server-sent events: session_opened, session_updated, session_exited and detection, pushed as
+    they happen, so a dashboard does not have to poll the list endpoints. Browsers resume
+    from the Last-Event-ID header on reconnect; last_event_id does the same as a query param.
+    """
+    if last_event_id is None and last_event_id_header and last_event_id_header.isdigit():
+        last_event_id = int(last_event_id_header)
+    sub = bus.subscribe(last_event_id)
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not sub.closed and not await request.is_disconnected():
+                events = await sub.next_batch(settings.EVENT_HEARTBEAT_SECONDS)
+                if not events:
+                    yield ": ping\n\n"
+                for event in events:
+                    yield _sse(event)
+        finally:
+            bus.unsubscribe(sub)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.websocket("/events/ws")
+async def stream_events_ws(websocket: WebSocket, last_event_id: Optional[int] = None):
+    """The same event stream over a WebSocket, one JSON event per message."""
+    await websocket.accept()
+    sub = bus.subscribe(last_event_id)
+    try:
+        while not sub.closed:
+            events = await sub.next_batch(settings.EVENT_HEARTBEAT_SECONDS)
+            if not events:
+                await websocket.send_text(json.dumps({"type": "ping"}))
+            for event in events:
+                await websocket.send_text(json.dumps(event, default=str))
+        await websocket.close(code=1013)  # fell too far behind; reconnect with last_event_id
+    except WebSocketDisconnect:
+        pass
+    finally:
+        bus.unsubscribe(sub)
 
 # Map residents to vehicles (since plate_number = vehicle)
 @router.get("/vehicles")
-def list_vehicles(db=Depends(get_db)):
-    return list_residents(db)
+def list_vehicles(response: Response, plate: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None, db=Depends(get_db)):
+    return list_residents(response, plate=plate, limit=limit, cursor=cursor, db=db)
 
 # Map residents to owners (since resident_name = owner)
 @router.get("/owners")
-def list_owners(db=Depends(get_db)):
-    return list_residents(db)
+def list_owners(response: Response, plate: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None, db=Depends(get_db)):
+    return list_residents(response, plate=plate, limit=limit, cursor=cursor, db=db)
 
 # Verifications can return sessions with status
 @router.get("/verifications")
-def list_verifications(db=Depends(get_db)):
-    return list_sessions(active_only=False, db=db)
+def list_verifications(response: Response, status: Optional[str] = None, plate: Optional[str] = None, since: Optional[datetime] = None,
+                       until: Optional[datetime] = None, limit: Optional[int] = None, cursor: Optional[str] = None, db=Depends(get_db)):
+    return list_sessions(response, status=status, plate=plate, since=since, until=until, limit=limit, cursor=cursor, db=db)
 
 # Simple mock auth (add proper JWT later)
 @router.post("/auth/login")
@@ -0,0 +1,320 @@
+"""
+Offline replay of recorded footage through the detection pipeline.
+
+    cd backend && python -m benchmarks.replay clips/gate1.mp4 frames/night/ --labels labels.csv --out run.json
+    python -m benchmarks.replay clips/gate1.mp4 --realtime                 # paced at the clip's own fps
+    python -m benchmarks.replay clips/gate1.mp4 --out new.json --baseline run.json
+
+Each source (a video file, or a directory of frame images replayed in name order) is read
+frame by frame and run through what the live loop (run_detection.run_serial) does: the
+motion/ROI gate, PlateDetector, the plate tracker choosing which crops to OCR, ocr_batch, and
+process_detection (crop storage included) for every event the live loop would upload, against
+a scratch database: a temporary SQLite file unless --url is given (empty databases only, as in
+db_writes). Crops are stored under the same temporary directory. By default frames are read
+as fast as they can be processed; --realtime sleeps to the source frame rate (--fps for frame
+directories) and counts the frames that fell behind. The gate and the tracker follow
+MOTION_GATING / TRACKING like the live loop; --no-gate and --no-tracking turn them off to
+measure every frame and every crop. Tracks age on the wall clock, as live, so only
+--realtime replays them at the pace they were recorded.
+
+Reported: frames/s, per-stage latency (read, detect, ocr per crop, db per uploaded plate, and
+the whole frame) as mean / p50 / p95 / p99 / max in ms, peak RSS, gate and tracker stats, and
+with --labels the accuracy of the recognised plates. The labels file is CSV with a header row:
+
+    source,frame,plate
+    gate1.mp4,120,LEA-1234
+    night,000045.jpg,ABC-123
+    gate1.mp4,,LEB-777
+
+frame is the frame index for videos and the file name for frame directories; leave it empty
+for a plate that shows up somewhere in the source. Plates compare on letters and digits only.
+Frame labels give exact-match and character accuracy of the OCR readings in those frames;
+every label also counts towards the per-source recall and precision of the uploaded plates.
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.timing import summarize
+
+FRAME_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def _configure(args):
+    # settings are read at import time, so the scratch database is chosen before importing the app
+    scratch = tempfile.mkdtemp(prefix="vs-replay-")
+    if args.url:
+        os.environ["DATABASE_URL"] = args.url
+    else:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(scratch, "replay.db")
+    # stored crops go to the scratch directory too, never the served image folder
+    os.environ["STATIC_IMAGE_DIR"] = os.path.join(scratch, "images")
+    os.environ.setdefault("SESSION_SWEEPER_ENABLED", "0")
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return round(peak / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0), 1)
+
+
+def _git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def iter_frames(source, fps):
+    """(frame_key, frame, fps) per frame: the frame index for videos, the file name for frame directories."""
+    import cv2
+    if os.path.isdir(source):
+        names = sorted(n for n in os.listdir(source) if n.lower().endswith(FRAME_EXTENSIONS))
+        for name in names:
+            frame = cv2.imread(os.path.join(source, name))
+            if frame is not None:
+                yield name, frame, fps
+        return
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise SystemExit(f"cannot open {source}")
+    rate = cap.get(cv2.CAP_PROP_FPS) or fps
+    try:
+        index = 0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                return
+            yield str(index), frame, rate
+            index += 1
+    finally:
+        cap.release()
+
+
+def load_labels(path):
+    """{source: {"frames": {frame_key: plate}, "plates": set(plates)}}, plates compacted."""
+    from detection.resident_index import compact
+    labels = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            plate = compact(row.get("plate"))
+            if not plate:
+                continue
+            entry = labels.setdefault((row.get("source") or "").strip(), {"frames": {}, "plates": set()})
+            entry["plates"].add(plate)
+            frame = (row.get("frame") or "").strip()
+            if frame:
+                entry["frames"][frame] = plate
+    return labels
+
+
+def score(labels, seen, uploaded):
+    """
+    labels: load_labels output; seen: {source: {frame_key: [OCR readings]}} and uploaded:
+    {source: set(plates)} from the replay. Frame scores use the closest reading in the frame,
+    so an extra false crop is not penalised twice.
+    """
+    from detection.resident_index import edit_distance
+    exact = chars = frames = 0
+    expected_total = found_total = hit_total = 0
+    per_source = {}
+    for source, entry in labels.items():
+        readings = seen.get(source, {})
+        for frame, plate in entry["frames"].items():
+            frames += 1
+            best = min((edit_distance(plate, r, len(plate)) for r in readings.get(frame, [])), default=len(plate))
+            exact += best == 0
+            chars += max(0.0, 1.0 - best / len(plate))
+        found = uploaded.get(source, set())
+        hits = len(entry["plates"] & found)
+        expected_total += len(entry["plates"])
+        found_total += len(found)
+        hit_total += hits
+        per_source[source] = {"expected": len(entry["plates"]), "recognised": len(found), "matched": hits,
+                              "missed": sorted(entry["plates"] - found)}
+    return {
+        "labelled_frames": frames,
+        "frame_exact": round(exact / frames, 4) if frames else None,
+        "frame_char_accuracy": round(chars / frames, 4) if frames else None,
+        "plate_recall": round(hit_total / expected_total, 4) if expected_total else None,
+        "plate_precision": round(hit_total / found_total, 4) if found_total else None,
+        "sources": per_source,
+    }
+
+
+def compare(report, baseline):
+    """Ratios against an earlier report: fps (higher is better) and stage p95 (lower is better)."""
+    out = {"fps": round(report["fps"] / baseline["fps"], 3) if baseline.get("fps") else None, "p95": {}}
+    for stage, cur in report["latency_ms"].items():
+        old = baseline.get("latency_ms", {}).get(stage, {})
+        if old.get("p95") and cur.get("p95") is not None:
+            out["p95"][stage] = round(cur["p95"] / old["p95"], 3)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded footage through the detection pipeline")
+    parser.add_argument("sources", nargs="+", help="video files and/or directories of frame images")
+    parser.add_argument("--labels", default="", help="CSV of source,frame,plate ground truth")
+    parser.add_argument("--out", default="", help="also write the JSON report to this file")
+    parser.add_argument("--baseline", default="", help="earlier JSON report to compare against")
+    parser.add_argument("--realtime", action="store_true", help="pace frames at the source frame rate")
+    parser.add_argument("--fps", type=float, default=25.0, help="frame rate of frame directories (default 25)")
+    parser.add_argument("--max-frames", type=int, default=0, help="stop each source after this many frames")
+    parser.add_argument("--camera-id", default="replay")
+    parser.add_argument("--no-gate", action="store_true", help="run the detector on every frame (no motion/ROI gate)")
+    parser.add_argument("--no-tracking", action="store_true", help="OCR and upload every crop (no plate tracker)")
+    parser.add_argument("--url", default="", help="database URL (default: temporary SQLite file)")
+    parser.add_argument("--drop", action="store_true", help="drop the tables afterwards (scratch --url databases)")
+    args = parser.parse_args()
+    _configure(args)
+
+    from models.base import Base, engine, upgrade_schema
+    from detection import session_manager as sm
+    from detection.detector import PlateDetector
+    from detection.ocr import ocr_batch, ocr_stats
+    from detection.resident_index import compact
+    from detection.motion import detect_gated
+    from detection import run_detection as live
+
+    upgrade_schema(engine)
+    labels = load_labels(args.labels) if args.labels else {}
+
+    t0 = time.perf_counter()
+    detector = PlateDetector()
+    detector.warm_up()
+    load_seconds = time.perf_counter() - t0
+
+    timings = {"read": [], "detect": [], "ocr": [], "db": [], "frame": []}
+    seen, uploaded = {}, {}
+    counts = {"frames": 0, "crops": 0, "plates": 0, "late_frames": 0}
+    gating = {}
+    tracking = {}
+
+    def upload(source, plate, crop, confidence):
+        t = time.perf_counter()
+        sm.process_detection(plate, crop, confidence, camera_id=args.camera_id)
+        timings["db"].append(time.perf_counter() - t)
+        counts["plates"] += 1
+        uploaded[source].add(compact(plate))
+
+    started = time.perf_counter()
+    for source in args.sources:
+        name = os.path.basename(os.path.normpath(source))
+        readings = seen.setdefault(name, {})
+        uploaded.setdefault(name, set())
+        # fresh per source, as each camera process has its own
+        gate = None if args.no_gate else live.make_gate()
+        tracker = None if args.no_tracking or not live.TRACKING else live.make_tracker()
+        frames = iter_frames(source, args.fps)
+        pace_start = time.perf_counter()
+        n = 0
+        while True:
+            t_read = time.perf_counter()
+            try:
+                key, frame, rate = next(frames)
+            except StopIteration:
+                break
+            t_detect = time.perf_counter()
+            dets = [d for d in detect_gated(detector, gate, frame) if d["crop"].size]
+            t_ocr = time.perf_counter()
+            timings["read"].append(t_detect - t_read)
+            timings["detect"].append(t_ocr - t_detect)
+            if tracker is not None:
+                wanted, events = tracker.update(dets)
+                dets = [d for _, d in wanted]
+            if dets:
+                t = time.perf_counter()
+                results = ocr_batch([d["crop"] for d in dets])
+                each = (time.perf_counter() - t) / len(dets)
+                timings["ocr"].extend([each] * len(dets))
+                counts["crops"] += len(dets)
+            else:
+                results = []
+            for i, (d, res) in enumerate(zip(dets, results)):
+                plate_text = res["text"]
+                confidence = res["confidence"] * d.get("confidence", 0.6)
+                if plate_text:
+                    readings.setdefault(key, []).append(compact(plate_text))
+                if tracker is not None:
+                    ev = tracker.add_reading(wanted[i][0], plate_text, confidence, d["crop"])
+                    if ev:
+                        events.append(ev)
+                # same noise threshold as the live loop before it uploads
+                elif plate_text and len(plate_text) >= 3:
+                    upload(name, plate_text, d["crop"], confidence)
+            if tracker is not None:
+                for ev in events:
+                    upload(name, ev["plate"], ev["crop"], ev["confidence"])
+            timings["frame"].append(time.perf_counter() - t_read)
+            counts["frames"] += 1
+            n += 1
+            if args.max_frames and n >= args.max_frames:
+                break
+            if args.realtime and rate:
+                delay = pace_start + n / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    counts["late_frames"] += 1
+        if tracker is not None:
+            for ev in tracker.flush():
+                upload(name, ev["plate"], ev["crop"], ev["confidence"])
+            tracking[name] = tracker.stats()
+        if gate is not None:
+            gating[name] = gate.stats()
+    elapsed = time.perf_counter() - started
+
+    sm.owner_resolver.stop()
+    sm.detection_writer.stop()
+    report = {
+        "time": datetime.utcnow().isoformat(),
+        "git": _git_revision(),
+        "python": platform.python_version(),
+        "sources": args.sources,
+        "mode": "realtime" if args.realtime else "max",
+        "detector": detector.backend,
+        "motion_gating": not args.no_gate and live.MOTION_GATING,
+        "tracking": not args.no_tracking and live.TRACKING,
+        "database": engine.dialect.name,
+        "model_load_seconds": round(load_seconds, 3),
+        "seconds": round(elapsed, 3),
+        "fps": round(counts["frames"] / elapsed, 2) if elapsed else 0.0,
+        **counts,
+        "latency_ms": {stage: summarize(samples, scale=1000.0) for stage, samples in timings.items()},
+        "peak_rss_mb": _peak_rss_mb(),
+        "ocr": ocr_stats(),
+        "gate": gating,
+        "tracker": tracking,
+        "detection_writer": sm.detection_writer.stats(),
+    }
+    if labels:
+        report["accuracy"] = score(labels, seen, uploaded)
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["vs_baseline"] = compare(report, json.load(f))
+    if args.drop:
+        Base.metadata.drop_all(bind=engine)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
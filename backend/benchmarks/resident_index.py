@@ -0,0 +1,92 @@
+"""
+Resident plate index benchmark.
+
+    cd backend && python -m benchmarks.resident_index --plates 50000 --queries 20000
+
+Builds a ResidentIndex from random plates in the configured formats and times match() for
+exact hits, OCR-confused plates (normalized hits), one-edit misreads (fuzzy hits) and
+unregistered plates (misses), in microseconds per lookup.
+"""
+import argparse
+import json
+import random
+import string
+import time
+from detection.plate_format import get_formats
+from detection.resident_index import ResidentIndex
+from benchmarks.timing import summarize
+
+_CONFUSE = {"0": "O", "1": "I", "8": "B", "5": "S", "O": "0", "I": "1", "B": "8", "S": "5"}
+
+
+def random_plate(rng, formats):
+    fmt = rng.choice(formats)
+    return "".join(rng.choice(string.ascii_uppercase) if c == "L" else rng.choice(string.digits) if c == "D"
+                   else rng.choice(string.ascii_uppercase + string.digits) if c == "A" else c for c in fmt.template)
+
+
+def confuse(rng, plate):
+    idx = [i for i, c in enumerate(plate) if c in _CONFUSE]
+    if not idx:
+        return plate
+    i = rng.choice(idx)
+    return plate[:i] + _CONFUSE[plate[i]] + plate[i + 1:]
+
+
+def misread(rng, plate):
+    i = rng.choice([i for i, c in enumerate(plate) if c.isalnum()])
+    pool = string.digits if plate[i].isdigit() else string.ascii_uppercase
+    return plate[:i] + rng.choice([c for c in pool if c != plate[i]]) + plate[i + 1:]
+
+
+def time_queries(index, queries, max_distance):
+    samples, kinds = [], {}
+    for q in queries:
+        t0 = time.perf_counter()
+        res = index.match(q, max_distance)
+        samples.append(time.perf_counter() - t0)
+        kind = res[1] if res else "none"
+        kinds[kind] = kinds.get(kind, 0) + 1
+    return dict(summarize(samples, scale=1e6), outcomes=kinds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ResidentIndex build and lookup benchmark")
+    parser.add_argument("--plates", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--max-distance", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    formats = get_formats()
+    plates = list({random_plate(rng, formats) for _ in range(args.plates)})
+    t0 = time.perf_counter()
+    index = ResidentIndex(args.max_distance)
+    index.load(enumerate(plates, 1))
+    build_s = time.perf_counter() - t0
+    registered = set(plates)
+
+    n = args.queries
+    sample = [rng.choice(plates) for _ in range(n)]
+    misses = []
+    while len(misses) < n:
+        p = random_plate(rng, formats)
+        if p not in registered:
+            misses.append(p)
+    report = {
+        "plates": len(plates),
+        "build_seconds": round(build_s, 3),
+        "fuzzy_keys": len(index._fuzzy),
+        "lookup_us": {
+            "exact": time_queries(index, sample, args.max_distance),
+            "ocr_confused": time_queries(index, [confuse(rng, p) for p in sample], args.max_distance),
+            "one_edit": time_queries(index, [misread(rng, p) for p in sample], args.max_distance),
+            "unregistered": time_queries(index, misses, args.max_distance),
+        },
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
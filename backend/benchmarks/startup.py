@@ -0,0 +1,112 @@
+"""
+Cold-start benchmark for the API server.
+
+    cd backend && python -m benchmarks.startup --runs 5 --max-import-seconds 3
+    python -m benchmarks.startup --serve        # also time uvicorn until /health is up and ready
+
+The app mounts ./static, so run it (or pass --cwd) from a directory that has one.
+
+Each run imports main in a fresh interpreter and records the wall time and which heavy ML
+modules got imported along the way; none of them should be, they load on the warm-up thread.
+Exits non-zero when a heavy module is imported eagerly or the median import time exceeds
+--max-import-seconds, so it can guard against regressions in CI.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that must never be imported just by loading the app
+HEAVY_MODULES = ["torch", "easyocr", "ultralytics", "pytesseract", "onnxruntime"]
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import main
+elapsed = time.perf_counter() - t0
+print(json.dumps({"seconds": elapsed, "heavy": [m for m in %r if m in sys.modules]}))
+"""
+
+
+def _env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in [BACKEND_DIR, env.get("PYTHONPATH", "")] if p)
+    return env
+
+
+def time_import(cwd):
+    out = subprocess.run([sys.executable, "-c", _PROBE % (HEAVY_MODULES,)], cwd=cwd, env=_env(),
+                         capture_output=True, text=True)
+    if out.returncode != 0:
+        raise SystemExit(f"importing main failed:\n{out.stderr}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_serve(cwd, timeout=300.0):
+    """Seconds until uvicorn answers /health, and until /health reports the models ready."""
+    import requests
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/health"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)], cwd=cwd, env=_env(),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    up = ready = None
+    try:
+        while time.perf_counter() - t0 < timeout and ready is None:
+            try:
+                body = requests.get(url, timeout=1).json()
+                if up is None:
+                    up = time.perf_counter() - t0
+                if body.get("ready"):
+                    ready = time.perf_counter() - t0
+            except requests.RequestException:
+                pass
+            time.sleep(0.05)
+    finally:
+        proc.terminate()
+        proc.wait(10)
+    return {"serving_seconds": up, "ready_seconds": ready}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API server cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-seconds", type=float, default=0.0, help="fail above this median (0 = no limit)")
+    parser.add_argument("--cwd", default=BACKEND_DIR, help="working directory for the app (needs ./static)")
+    parser.add_argument("--serve", action="store_true", help="also time uvicorn until /health is up and ready")
+    args = parser.parse_args()
+
+    runs = [time_import(args.cwd) for _ in range(args.runs)]
+    times = [r["seconds"] for r in runs]
+    heavy = sorted({m for r in runs for m in r["heavy"]})
+    report = {
+        "runs": args.runs,
+        "import_median_s": round(statistics.median(times), 3),
+        "import_min_s": round(min(times), 3),
+        "import_max_s": round(max(times), 3),
+        "heavy_modules_imported": heavy,
+    }
+    if args.serve:
+        report.update(time_serve(args.cwd))
+    print(json.dumps(report, indent=2))
+
+    failed = bool(heavy)
+    if args.max_import_seconds and report["import_median_s"] > args.max_import_seconds:
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
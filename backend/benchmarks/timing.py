@@ -0,0 +1,21 @@
+def percentile(sorted_samples, q):
+    """Nearest-rank percentile of an already sorted list; q in [0, 100]."""
+    if not sorted_samples:
+        return 0.0
+    k = max(0, min(len(sorted_samples) - 1, int(round(q / 100.0 * len(sorted_samples) + 0.5)) - 1))
+    return sorted_samples[k]
+
+
+def summarize(samples, scale=1.0, digits=3):
+    """count / mean / p50 / p95 / p99 / max of a list of durations, multiplied by scale."""
+    s = sorted(samples)
+    if not s:
+        return {"count": 0}
+    return {
+        "count": len(s),
+        "mean": round(sum(s) / len(s) * scale, digits),
+        "p50": round(percentile(s, 50) * scale, digits),
+        "p95": round(percentile(s, 95) * scale, digits),
+        "p99": round(percentile(s, 99) * scale, digits),
+        "max": round(s[-1] * scale, digits),
+    }
@@ -0,0 +1,81 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from utils.config import settings
+from utils.logger import get_logger
+
+logger = get_logger()
+
+
+class BatchScheduler:
+    """
+    Collects frames from several callers (e.g. one thread per camera) and runs them through
+    PlateDetector.detect_batch together: a batch is dispatched once max_batch frames are waiting
+    or max_wait seconds after the first one arrived. It exposes detect_in_frame, so it can be
+    handed to run_camera in place of a detector.
+    """
+
+    def __init__(self, detector, max_batch=None, max_wait=None):
+        self.detector = detector
+        self.max_batch = max_batch or settings.DETECTION_BATCH_SIZE
+        self.max_wait = max_wait if max_wait is not None else settings.DETECTION_BATCH_WAIT_MS / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.frames = 0
+        self.infer_seconds = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="detect-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, frame):
+        if self._thread is None:
+            self.start()
+        fut = Future()
+        self._queue.put((frame, fut))
+        return fut
+
+    def detect_in_frame(self, frame):
+        return self.submit(frame).result()
+
+    def detect_batch(self, frames):
+        return [f.result() for f in [self.submit(fr) for fr in frames]]
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            t0 = time.perf_counter()
+            try:
+                results = self.detector.detect_batch([frame for frame, _ in batch])
+                for (_, fut), res in zip(batch, results):
+                    fut.set_result(res)
+            except Exception as e:
+                logger.exception("Batched detection failed: %s", e)
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+            self.infer_seconds += time.perf_counter() - t0
+            self.batches += 1
+            self.frames += len(batch)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "frames": self.frames,
+            "avg_batch": self.frames / self.batches if self.batches else 0.0,
+            "avg_frame_ms": self.infer_seconds / self.frames * 1000.0 if self.frames else 0.0,
+        }
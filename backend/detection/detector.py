@@ -1,9 +1,9 @@
 import cv2
-import time
 import os
+import time
 from utils.config import settings
-from .ocr import ocr_image
-from pathlib import Path
+from utils.metrics import detect_seconds
+from .image_store import store_image_array
 import numpy as np
 from utils.logger import get_logger
 
@@ -12,54 +12,134 @@ logger = get_logger()
 # Simple plate detector using Haar cascade xml if YOLO model missing
 CASCADE_PATH = cv2.data.haarcascades + "haarcascade_russian_plate_number.xml"
 
+
+def letterbox(frame, size):
+    """
+    Resize keeping aspect ratio and pad to a size x size square (grey border, like YOLO training).
+    returns (image, scale, (pad_x, pad_y))
+    """
+    h, w = frame.shape[:2]
+    scale = min(size / float(h), size / float(w))
+    nh, nw = int(round(h * scale)), int(round(w * scale))
+    resized = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR) if (nh, nw) != (h, w) else frame
+    pad_x, pad_y = (size - nw) // 2, (size - nh) // 2
+    out = np.full((size, size, 3), 114, dtype=np.uint8)
+    out[pad_y:pad_y + nh, pad_x:pad_x + nw] = resized
+    return out, scale, (pad_x, pad_y)
+
+
+def unletterbox(boxes, scale, pad, shape):
+    """Map (N, 4) xyxy boxes from letterboxed coordinates back to the original frame, clipped, as ints."""
+    if len(boxes) == 0:
+        return np.zeros((0, 4), dtype=np.int32)
+    boxes = (np.asarray(boxes, dtype=np.float32) - np.array([pad[0], pad[1], pad[0], pad[1]], dtype=np.float32)) / scale
+    h, w = shape[:2]
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+    return boxes.round().astype(np.int32)
+
+
+def _to_dets(frame, boxes, confs):
+    return [{"bbox": (int(x1), int(y1), int(x2), int(y2)), "confidence": float(c), "crop": frame[y1:y2, x1:x2]}
+            for (x1, y1, x2, y2), c in zip(boxes.tolist(), confs.tolist())]
+
+
 class PlateDetector:
-    def __init__(self, model_path=None):
+    """
+    Backends, picked by DETECTION_BACKEND (auto | onnx | yolo | cascade):
+    - onnx: exported model via onnxruntime / cv2.dnn (auto when DETECTION_MODEL_PATH ends in .onnx)
+    - yolo: ultralytics YOLO weights
+    - cascade: Haar cascade fallback when no model is configured or loading fails
+    """
+
+    def __init__(self, model_path=None, backend=None):
         self.model_path = model_path or settings.DETECTION_MODEL_PATH
         self.use_yolo = False
         self.net = None
-        if self.model_path and os.path.exists(self.model_path):
+        self.onnx = None
+        self.input_size = settings.DETECTION_INPUT_SIZE
+        backend = backend or settings.DETECTION_BACKEND
+        if backend == "auto":
+            backend = "onnx" if self.model_path.lower().endswith(".onnx") else "yolo"
+        self.backend = "cascade"
+        if backend != "cascade" and self.model_path and os.path.exists(self.model_path):
             try:
-                # try ultralytics YOLO model
-                from ultralytics import YOLO
-                self.model = YOLO(self.model_path)
-                self.use_yolo = True
-                logger.info("Using YOLO model for plate detection")
+                if backend == "onnx":
+                    from .onnx_backend import OnnxPlateModel
+                    self.onnx = OnnxPlateModel(
+                        self.model_path, input_size=self.input_size,
+                        conf_threshold=settings.DETECTION_CONF_THRESHOLD, iou_threshold=settings.DETECTION_IOU_THRESHOLD,
+                        threads=settings.DETECTION_THREADS, int8=settings.DETECTION_ONNX_INT8,
+                    )
+                    self.backend = "onnx"
+                    logger.info("Using ONNX model for plate detection")
+                else:
+                    # try ultralytics YOLO model
+                    from ultralytics import YOLO
+                    self.model = YOLO(self.model_path)
+                    self.use_yolo = True
+                    self.backend = "yolo"
+                    logger.info("Using YOLO model for plate detection")
             except Exception as e:
-                logger.warning("YOLO load failed, falling back to cascade: %s", e)
-                self.cascade = cv2.CascadeClassifier(CASCADE_PATH)
-        else:
+                logger.warning("%s load failed, falling back to cascade: %s", backend, e)
+        if self.backend == "cascade":
             self.cascade = cv2.CascadeClassifier(CASCADE_PATH)
             logger.info("Using Haar cascade for plate detection")
 
+    def warm_up(self):
+        """One inference on a blank frame so the first real frame does not pay for allocation/JIT."""
+        if self.backend != "cascade":
+            self.detect_batch([np.zeros((self.input_size, self.input_size, 3), np.uint8)])
+
     def detect_in_frame(self, frame):
         """
         frame: BGR numpy array
         returns list of dicts: {bbox, confidence, crop}
         """
         out = []
-        if self.use_yolo:
-            results = self.model(frame)
-            for r in results:
-                boxes = r.boxes
-                for box in boxes:
-                    x1,y1,x2,y2 = map(int, box.xyxy[0].tolist())
-                    conf = float(box.conf[0])
-                    crop = frame[y1:y2, x1:x2]
-                    out.append({"bbox": (x1,y1,x2,y2), "confidence": conf, "crop": crop})
+        if self.backend != "cascade":
+            return self.detect_batch([frame])[0]
         else:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            plates = self.cascade.detectMultiScale(gray, 1.1, 4)
+            with detect_seconds.time("cascade"):
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                plates = self.cascade.detectMultiScale(gray, 1.1, 4)
             for (x,y,w,h) in plates:
                 x1,y1,x2,y2 = x,y,x+w,y+h
                 crop = frame[y1:y2, x1:x2]
                 out.append({"bbox": (x1,y1,x2,y2), "confidence": 0.6, "crop": crop})
         return out
 
-# Helper to save cropped plate image
+    def detect_batch(self, frames):
+        """
+        frames: list of BGR numpy arrays (any resolution, e.g. from several cameras)
+        returns one detect_in_frame-style list per frame.
+        YOLO/ONNX: every frame is letterboxed to DETECTION_INPUT_SIZE and the whole list runs as one
+        batch; boxes are mapped back with vectorized numpy. The cascade has no batch mode.
+        """
+        if not frames:
+            return []
+        if self.backend == "cascade":
+            return [self.detect_in_frame(f) for f in frames]
+        t0 = time.perf_counter()
+        try:
+            return self._detect_model(frames)
+        finally:
+            detect_seconds.observe(time.perf_counter() - t0, self.backend)
+
+    def _detect_model(self, frames):
+        metas = [letterbox(f, self.input_size) for f in frames]
+        if self.backend == "onnx":
+            preds = self.onnx.infer([m[0] for m in metas])
+            return [_to_dets(frame, unletterbox(boxes, scale, pad, frame.shape), scores)
+                    for frame, (_, scale, pad), (boxes, scores) in zip(frames, metas, preds)]
+        results = self.model([m[0] for m in metas], imgsz=self.input_size, verbose=False)
+        out = []
+        for frame, (_, scale, pad), r in zip(frames, metas, results):
+            xyxy = r.boxes.xyxy.cpu().numpy()
+            confs = r.boxes.conf.cpu().numpy()
+            out.append(_to_dets(frame, unletterbox(xyxy, scale, pad, frame.shape), confs))
+        return out
+
+# Helper to save cropped plate image (content-addressed: one file per distinct crop)
 def save_crop_image(crop, plate_text, static_dir, camera_id="cam0"):
-    Path(static_dir).mkdir(parents=True, exist_ok=True)
-    ts = int(time.time()*1000)
-    filename = f"{camera_id}_{plate_text or 'unknown'}_{ts}.jpg"
-    path = os.path.join(static_dir, filename)
-    cv2.imwrite(path, crop)
-    return path
+    return store_image_array(crop, static_dir, camera_id=camera_id)
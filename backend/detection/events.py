@@ -0,0 +1,127 @@
+import asyncio
+import itertools
+import threading
+from collections import deque
+from datetime import datetime
+from utils.config import settings
+from utils.logger import get_logger
+
+logger = get_logger()
+
+
+class Subscriber:
+    """
+    One connected client. Its buffer is bounded: when the client reads slower than events
+    arrive, it is cut off on the first event that does not fit (never blocking the publisher).
+    Nothing is dropped from the middle of its stream, so on reconnect its Last-Event-ID picks
+    up exactly where it stopped, from history or with a "reset".
+    """
+
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.buffer = deque()
+        self.maxsize = maxsize
+        self.closed = False
+        self._ready = asyncio.Event()
+
+    def push(self, event):
+        if self.closed:
+            return
+        if len(self.buffer) >= self.maxsize:
+            self.closed = True
+        else:
+            self.buffer.append(event)
+        try:
+            self.loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            self.closed = True  # its event loop is gone
+
+    async def next_batch(self, timeout):
+        """Buffered events, waiting up to timeout for one; [] on timeout."""
+        if not self.buffer:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        out = []
+        while self.buffer:
+            out.append(self.buffer.popleft())
+        return out
+
+
+class EventBus:
+    """
+    In-process pub/sub for live dashboard updates. publish() may be called from any thread
+    (ingest workers, the sweeper); subscribers are asyncio consumers in the web process.
+    The last `history` events are kept so a reconnecting client can resume from an event id.
+    """
+
+    def __init__(self, history=1000, client_buffer=256):
+        self.client_buffer = client_buffer
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.published = 0
+        self.disconnected_slow = 0
+
+    def publish(self, event_type, data):
+        with self._lock:
+            event = {"id": next(self._ids), "type": event_type, "time": datetime.utcnow().isoformat(), "data": data}
+            self._history.append(event)
+            self.published += 1
+            for sub in list(self._subscribers):
+                sub.push(event)
+                if sub.closed:
+                    self._subscribers.discard(sub)
+                    self.disconnected_slow += 1
+        return event["id"]
+
+    def subscribe(self, last_event_id=None):
+        """
+        Register a client on the running loop. With last_event_id, events after it that are
+        still in history are queued first. If events were missed (the id is older than the
+        history, from before a server restart, or more than fit in the client's buffer), a
+        "reset" event tells the client to refetch state through the list endpoints instead.
+        """
+        sub = Subscriber(asyncio.get_running_loop(), self.client_buffer)
+        with self._lock:
+            if last_event_id is not None:
+                latest = self._history[-1]["id"] if self._history else 0
+                oldest = self._history[0]["id"] if self._history else latest + 1
+                if last_event_id > latest or last_event_id < oldest - 1 or latest - last_event_id > self.client_buffer:
+                    sub.push({"id": latest, "type": "reset", "time": datetime.utcnow().isoformat(), "data": {}})
+                    last_event_id = latest
+                for event in self._history:
+                    if event["id"] > last_event_id:
+                        sub.push(event)
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+        sub.closed = True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "published": self.published,
+                "history": len(self._history),
+                "disconnected_slow": self.disconnected_slow,
+                "buffered_max": max((len(s.buffer) for s in self._subscribers), default=0),
+            }
+
+
+bus = EventBus(history=settings.EVENT_HISTORY_SIZE, client_buffer=settings.EVENT_CLIENT_BUFFER)
+
+
+def publish(event_type, data):
+    try:
+        return bus.publish(event_type, data)
+    except Exception as e:
+        # live updates must never fail a detection write
+        logger.warning("Event publish failed: %s", e)
+        return None
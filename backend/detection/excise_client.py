@@ -0,0 +1,167 @@
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from utils.config import settings
+from utils.logger import get_logger
+
+logger = get_logger()
+
+
+class RateLimiter:
+    """Token bucket: acquire() blocks until a token is available (rate per second, burst capacity)."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and rejects calls for `cooldown` seconds,
+    then lets a single probe through (half-open); a successful probe closes it again.
+    """
+
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            # a failed probe re-opens the breaker; otherwise trip once the threshold is reached
+            if self._probing or (self.opened_at is None and self.failures >= self.threshold):
+                self.trips += 1
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class ExciseClient:
+    """
+    Pooled keep-alive HTTP client for the excise lookup with a concurrency cap, a rate limit,
+    retries with exponential backoff (on connection errors, 429 and 5xx) and a circuit breaker.
+    fetch() returns the 200 response, or None when the lookup failed or was rejected.
+    """
+
+    def __init__(self, base_url, concurrency=4, rate=5.0, retries=2, backoff=0.5, timeout=8.0,
+                 breaker_threshold=5, breaker_cooldown=30.0):
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency, max_retries=0)
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+        self.limiter = RateLimiter(rate, burst=concurrency)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self.requests = 0
+        self.retried = 0
+        self.rejected = 0
+
+    def fetch(self, plate_number):
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                self.rejected += 1
+                logger.warning("Excise circuit open, skipping lookup for %s", plate_number)
+                return None
+            self.limiter.acquire()
+            with self._slots:
+                self.requests += 1
+                try:
+                    resp = self.http.get(f"{self.base_url}/search", params={"plate": plate_number}, timeout=self.timeout)
+                    if resp.status_code == 200:
+                        self.breaker.success()
+                        return resp
+                    logger.warning("Excise site returned %s", resp.status_code)
+                    if resp.status_code != 429 and resp.status_code < 500:
+                        # the site is up, it just has nothing for this plate
+                        self.breaker.success()
+                        return None
+                except requests.RequestException as e:
+                    logger.error("Excise lookup failed: %s", e)
+            self.breaker.failure()
+            if attempt == self.retries:
+                break
+            self.retried += 1
+            time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+        return None
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "retried": self.retried,
+            "rejected": self.rejected,
+            "breaker": self.breaker.state,
+            "breaker_trips": self.breaker.trips,
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ExciseClient(
+                    settings.EXCISE_LOOKUP_BASE_URL,
+                    concurrency=settings.EXCISE_MAX_CONCURRENCY,
+                    rate=settings.EXCISE_RATE_LIMIT_PER_SECOND,
+                    retries=settings.EXCISE_RETRIES,
+                    backoff=settings.EXCISE_BACKOFF_SECONDS,
+                    timeout=settings.EXCISE_TIMEOUT_SECONDS,
+                    breaker_threshold=settings.EXCISE_BREAKER_THRESHOLD,
+                    breaker_cooldown=settings.EXCISE_BREAKER_COOLDOWN_SECONDS,
+                )
+    return _client
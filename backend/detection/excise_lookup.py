@@ -1,62 +1,247 @@
-import requests
 import json
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy.exc import IntegrityError
 from utils.config import settings
 from models.owner_cache import OwnerCache
+from detection.excise_client import get_client
 from models.base import SessionLocal
 from utils.logger import get_logger
-from datetime import datetime
+from utils.metrics import owner_lookup_seconds
+from datetime import datetime, timedelta
 
 logger = get_logger()
 
+
+class _LRU:
+    """Small thread-safe LRU whose entries carry their own expiry time."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[0] <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return item[1]
+
+    def put(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class _Entry:
+    __slots__ = ("owner_id", "data", "negative")
+
+    def __init__(self, owner_id, data, negative=False):
+        self.owner_id = owner_id
+        self.data = data
+        self.negative = negative
+
+
+class _Call:
+    """One in-flight upstream lookup that concurrent callers for the same plate wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+_memory = _LRU(settings.OWNER_CACHE_SIZE)
+_inflight = {}
+_inflight_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {
+    "memory_hits": 0,
+    "negative_hits": 0,
+    "db_hits": 0,
+    "misses": 0,
+    "coalesced": 0,
+    "upstream_calls": 0,
+    "upstream_failures": 0,
+    "lookups": 0,
+    "lookup_ms_total": 0.0,
+    "upstream_ms_total": 0.0,
+}
+
+
+def _count(key, value=1):
+    with _stats_lock:
+        _stats[key] += value
+
+
+def lookup_stats():
+    """Hit/miss counters and mean latencies for the owner lookup tiers."""
+    with _stats_lock:
+        s = dict(_stats)
+    s["memory_entries"] = len(_memory)
+    s["avg_lookup_ms"] = s["lookup_ms_total"] / s["lookups"] if s["lookups"] else 0.0
+    s["avg_upstream_ms"] = s["upstream_ms_total"] / s["upstream_calls"] if s["upstream_calls"] else 0.0
+    hits = s["memory_hits"] + s["negative_hits"] + s["db_hits"]
+    s["hit_rate"] = hits / (hits + s["misses"]) if hits + s["misses"] else 0.0
+    if settings.EXCISE_LOOKUP_BASE_URL:
+        s["upstream"] = get_client().stats()
+    return s
+
+
+def cached_owner(plate_number: str):
+    """(owner_id, owner data) if the plate is in the in-process cache with a stored owner row, else None."""
+    entry = _memory.get(plate_number)
+    if entry is None or entry.owner_id is None:
+        return None
+    return entry.owner_id, entry.data
+
+
 def lookup_plate(plate_number: str) -> dict:
     """
     Lookup owner details from owner_cache or Sindh excise.
     Returns dict with owner_name, vehicle_model, registration_date, raw_data.
+    Tiers: in-process LRU -> owner_cache row (fresh while last_checked is within
+    OWNER_CACHE_TTL_SECONDS) -> excise site. Failed upstream lookups are cached in memory
+    for OWNER_NEGATIVE_TTL_SECONDS, and concurrent misses for one plate share a single request.
     """
+    t0 = time.perf_counter()
+    source = "lookup"
+    try:
+        entry = _memory.get(plate_number)
+        if entry is not None:
+            source = "negative" if entry.negative else "memory"
+            _count(source + "_hits")
+            return entry.data
+
+        with _inflight_lock:
+            call = _inflight.get(plate_number)
+            leader = call is None
+            if leader:
+                call = _inflight[plate_number] = _Call()
+        if not leader:
+            source = "coalesced"
+            _count("coalesced")
+            call.done.wait(settings.OWNER_LOOKUP_WAIT_SECONDS)
+            return call.result if call.result is not None else _mock_owner(plate_number)
+
+        try:
+            call.result = _lookup_uncached(plate_number)
+            return call.result
+        finally:
+            call.done.set()
+            with _inflight_lock:
+                _inflight.pop(plate_number, None)
+    finally:
+        elapsed = time.perf_counter() - t0
+        _count("lookups")
+        _count("lookup_ms_total", elapsed * 1000.0)
+        owner_lookup_seconds.observe(elapsed, source)
+
+
+def _row_data(row):
+    return {
+        "owner_name": row.owner_name,
+        "vehicle_model": row.vehicle_model,
+        "registration_date": row.registration_date,
+        "raw_data": row.raw_data
+    }
+
+
+def _lookup_uncached(plate_number):
     db = SessionLocal()
     try:
+        ttl = settings.OWNER_CACHE_TTL_SECONDS
         # check cache
         cache = db.query(OwnerCache).filter(OwnerCache.plate_number == plate_number).first()
-        if cache:
-            logger.info("Cache hit for %s", plate_number)
-            return {
-                "owner_name": cache.owner_name,
-                "vehicle_model": cache.vehicle_model,
-                "registration_date": cache.registration_date,
-                "raw_data": cache.raw_data
-            }
+        if cache and (cache.last_checked is None or datetime.utcnow() - cache.last_checked < timedelta(seconds=ttl)):
+            logger.debug("Cache hit for %s", plate_number)
+            _count("db_hits")
+            data = _row_data(cache)
+            _memory.put(plate_number, _Entry(cache.id, data), ttl)
+            return data
+        _count("misses")
+
         # attempt to query excise
         if settings.EXCISE_LOOKUP_BASE_URL:
-            try:
-                # This is a placeholder call — update to actual excise endpoint and parsing.
-                resp = requests.get(f"{settings.EXCISE_LOOKUP_BASE_URL}/search?plate={plate_number}", timeout=8)
-                if resp.status_code == 200:
-                    data = resp.text
-                    # parse actual html / json accordingly; below is mock parsing
-                    parsed = {"owner_name": "Parsed Owner", "vehicle_model": "Parsed Model", "registration_date": str(datetime.utcnow().date()), "raw_data": data}
-                else:
-                    logger.warning("Excise site returned %s", resp.status_code)
-                    parsed = _mock_owner(plate_number)
-            except Exception as e:
-                logger.error("Excise lookup failed: %s", e)
-                parsed = _mock_owner(plate_number)
+            parsed = _fetch_excise(plate_number)
+            if parsed is None:
+                # negative-cache the failure; serve the stale row if we have one, else a mock that is not persisted
+                data = _row_data(cache) if cache else _mock_owner(plate_number)
+                _memory.put(plate_number, _Entry(cache.id if cache else None, data, negative=True), settings.OWNER_NEGATIVE_TTL_SECONDS)
+                return data
         else:
             parsed = _mock_owner(plate_number)
 
         # cache results
-        new_cache = OwnerCache(
-            plate_number=plate_number,
-            owner_name=parsed.get("owner_name"),
-            vehicle_model=parsed.get("vehicle_model"),
-            registration_date=parsed.get("registration_date"),
-            raw_data=json.dumps(parsed.get("raw_data") or {})
-        )
-        db.add(new_cache)
-        db.commit()
+        owner_id = _store(db, cache, plate_number, parsed)
+        _memory.put(plate_number, _Entry(owner_id, parsed), ttl)
         return parsed
     finally:
         db.close()
 
+
+def _fetch_excise(plate_number):
+    """Upstream lookup through the pooled, rate-limited client; returns parsed owner dict or None on failure."""
+    _count("upstream_calls")
+    t0 = time.perf_counter()
+    try:
+        resp = get_client().fetch(plate_number)
+    finally:
+        elapsed = time.perf_counter() - t0
+        _count("upstream_ms_total", elapsed * 1000.0)
+        owner_lookup_seconds.observe(elapsed, "upstream")
+    if resp is None:
+        _count("upstream_failures")
+        return None
+    data = resp.text
+    try:
+        body = resp.json()
+    except ValueError:
+        body = None
+    if isinstance(body, dict) and body.get("owner_name"):
+        return {"owner_name": body.get("owner_name"), "vehicle_model": body.get("vehicle_model"), "registration_date": body.get("registration_date"), "raw_data": data}
+    # parse actual html accordingly; below is mock parsing
+    return {"owner_name": "Parsed Owner", "vehicle_model": "Parsed Model", "registration_date": str(datetime.utcnow().date()), "raw_data": data}
+
+
+def _store(db, cache, plate_number, parsed):
+    """Insert or refresh the owner_cache row; tolerates another worker inserting the same plate first."""
+    fields = dict(
+        owner_name=parsed.get("owner_name"),
+        vehicle_model=parsed.get("vehicle_model"),
+        registration_date=parsed.get("registration_date"),
+        raw_data=json.dumps(parsed.get("raw_data") or {}),
+        last_checked=datetime.utcnow(),
+    )
+    if cache is None:
+        cache = OwnerCache(plate_number=plate_number, **fields)
+        db.add(cache)
+        try:
+            db.commit()
+            return cache.id
+        except IntegrityError:
+            db.rollback()
+            cache = db.query(OwnerCache).filter(OwnerCache.plate_number == plate_number).first()
+    for k, v in fields.items():
+        setattr(cache, k, v)
+    db.commit()
+    return cache.id
+
+
 def _mock_owner(plate):
     return {
         "owner_name": f"Owner of {plate}",
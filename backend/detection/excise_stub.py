@@ -0,0 +1,122 @@
+"""
+Local stand-in for the excise lookup site, for offline throughput and failure testing.
+
+    python -m detection.excise_stub --port 9100 --latency 0.2 --fail-rate 0.1
+    EXCISE_LOOKUP_BASE_URL=http://127.0.0.1:9100 uvicorn main:app
+
+GET /search?plate=ABC-123 returns a JSON owner record after --latency (+/- --jitter) seconds.
+A --fail-rate fraction of requests returns 503, and --rate-limit answers 429 once that many
+requests per second are exceeded. GET /stats reports what the stub has served.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class StubState:
+    def __init__(self, latency=0.1, jitter=0.0, fail_rate=0.0, rate_limit=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.rate_limit = rate_limit
+        self.served = 0
+        self.failed = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._window = []
+        self._lock = threading.Lock()
+
+    def throttle(self):
+        if self.rate_limit <= 0:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            self._window = [t for t in self._window if now - t < 1.0]
+            if len(self._window) >= self.rate_limit:
+                self.throttled += 1
+                return True
+            self._window.append(now)
+            return False
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real client expects
+
+        def _send(self, code, body):
+            payload = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/stats":
+                return self._send(200, {k: v for k, v in vars(state).items() if not k.startswith("_")})
+            if url.path != "/search":
+                return self._send(404, {"error": "not found"})
+            if state.throttle():
+                return self._send(429, {"error": "rate limited"})
+            plate = parse_qs(url.query).get("plate", [""])[0]
+            with state._lock:
+                state.in_flight += 1
+                state.max_in_flight = max(state.max_in_flight, state.in_flight)
+            try:
+                time.sleep(max(0.0, state.latency + random.uniform(-state.jitter, state.jitter)))
+                if random.random() < state.fail_rate:
+                    with state._lock:
+                        state.failed += 1
+                    return self._send(503, {"error": "upstream unavailable"})
+                with state._lock:
+                    state.served += 1
+                return self._send(200, {
+                    "plate": plate,
+                    "owner_name": f"Stub Owner {plate}",
+                    "vehicle_model": "Stub Model",
+                    "registration_date": "2020-01-01",
+                })
+            finally:
+                with state._lock:
+                    state.in_flight -= 1
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=9100, **kwargs):
+    """Start the stub in a background thread; returns (server, state)."""
+    state = StubState(**kwargs)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    threading.Thread(target=server.serve_forever, name="excise-stub", daemon=True).start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local excise lookup stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    args = parser.parse_args()
+    state = StubState(args.latency, args.jitter, args.fail_rate, args.rate_limit)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"excise stub listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Crop storage.
+
+Crops are content-addressed and sharded by day and camera under STATIC_IMAGE_DIR:
+
+    2026/10/17/gate1/<sha1>.jpg
+
+so no directory grows past one camera-day, and retention can work a day at a time
+(detection/retention.py). Detection.image_path keeps the full path of the file; read_image()
+resolves it whether the file is still in place or has since been packed into the per-day
+archive (archive/2026-10-17.zip, member "2026/10/17/gate1/<sha1>.jpg"). Files written before
+sharding sit directly in STATIC_IMAGE_DIR and resolve the same way; their keys carry no day, so
+retention records the archive each was packed into in archive/legacy.idx.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from datetime import datetime
+from utils.config import settings
+from utils.metrics import image_write_seconds
+
+ARCHIVE_DIR = "archive"
+LEGACY_INDEX = "legacy.idx"
+MEDIA_TYPES = {".jpg": "image/jpeg", ".png": "image/png", ".webp": "image/webp"}
+_DAY_KEY = re.compile(r"^(\d{4})/(\d{2})/(\d{2})/")
+
+
+def _guess_ext(data):
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return ".png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return ".webp"
+    return ".jpg"
+
+
+def crop_ext():
+    return ".webp" if settings.CROP_FORMAT.lower() == "webp" else ".jpg"
+
+
+def content_name(data, ext=None):
+    """Content-addressed filename: identical bytes always map to the same file."""
+    return hashlib.sha1(data).hexdigest() + (ext or _guess_ext(data))
+
+
+def shard_dir(camera_id=None, when=None):
+    """Relative day/camera directory for a crop taken at when (UTC now by default)."""
+    when = when or datetime.utcnow()
+    camera = re.sub(r"[^A-Za-z0-9_.-]", "_", camera_id or "cam0").strip(".") or "cam0"
+    return os.path.join(when.strftime("%Y"), when.strftime("%m"), when.strftime("%d"), camera)
+
+
+def _write_atomic(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def store_image_bytes(data, static_dir=None, ext=None, camera_id=None, when=None):
+    """
+    Store already-encoded image bytes once and return the path.
+    The write goes through a temp file + rename, so readers never see a partial image and
+    re-uploading the same crop is a no-op. With CROP_SHARDING the file lands in its
+    day/camera shard, else directly in static_dir.
+    """
+    static_dir = static_dir or settings.STATIC_IMAGE_DIR
+    directory = os.path.join(static_dir, shard_dir(camera_id, when)) if settings.CROP_SHARDING else static_dir
+    path = os.path.join(directory, content_name(data, ext))
+    if os.path.exists(path):
+        return path
+    t0 = time.perf_counter()
+    _write_atomic(path, data)
+    image_write_seconds.observe(time.perf_counter() - t0)
+    return path
+
+
+def _encode_params(ext):
+    import cv2
+    if ext == ".webp":
+        return [cv2.IMWRITE_WEBP_QUALITY, settings.CROP_WEBP_QUALITY]
+    if ext == ".jpg":
+        return [cv2.IMWRITE_JPEG_QUALITY, settings.CROP_JPEG_QUALITY]
+    return []
+
+
+def encode_image(crop, ext=None):
+    """Encode a BGR array; ext defaults to CROP_FORMAT at the configured quality."""
+    import cv2
+    ext = ext or crop_ext()
+    ok, buf = cv2.imencode(ext, crop, _encode_params(ext))
+    if not ok:
+        raise ValueError("could not encode image")
+    return buf.tobytes()
+
+
+def store_image_array(crop, static_dir=None, ext=None, camera_id=None):
+    """Encode a BGR crop once and store it content-addressed."""
+    ext = ext or crop_ext()
+    return store_image_bytes(encode_image(crop, ext), static_dir, ext, camera_id=camera_id)
+
+
+def store_upload(data, camera_id=None, image=None):
+    """
+    Store uploaded crop bytes. Bytes already in CROP_FORMAT are kept as they are (no decode);
+    anything else is re-encoded, reusing image when the caller has already decoded it.
+    """
+    if _guess_ext(data) == crop_ext():
+        return store_image_bytes(data, camera_id=camera_id)
+    return store_image_array(image if image is not None else decode_image(data), camera_id=camera_id)
+
+
+def decode_image(data):
+    """Decode image bytes to a BGR numpy array; only call this when pixels are actually needed."""
+    import cv2
+    import numpy as np
+    arr = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if arr is None:
+        raise ValueError("could not decode image")
+    return arr
+
+
+def image_key(image_path, static_dir=None):
+    """
+    Storage key of a stored crop ("2026/10/17/gate1/<sha1>.jpg", or "<sha1>.jpg" for
+    unsharded files): image_path relative to static_dir. Keys from clients are accepted
+    too. None for anything that would resolve outside static_dir.
+    """
+    if not image_path:
+        return None
+    static_dir = os.path.abspath(static_dir or settings.STATIC_IMAGE_DIR)
+    path = image_path if os.path.isabs(image_path) else os.path.join(static_dir, image_path)
+    key = os.path.relpath(os.path.abspath(path), static_dir).replace(os.sep, "/")
+    if key.startswith("../") or key == ".." or key.startswith(ARCHIVE_DIR + "/"):
+        return None
+    return key
+
+
+def archive_path(day, static_dir=None):
+    """Per-day archive of packed crops; day is a date or "YYYY-MM-DD"."""
+    name = day if isinstance(day, str) else day.strftime("%Y-%m-%d")
+    return os.path.join(static_dir or settings.STATIC_IMAGE_DIR, ARCHIVE_DIR, name + ".zip")
+
+
+class _ArchiveCache:
+    """
+    Open archives, least recently used first out. Opening a day's zip parses its whole
+    central directory, so a dashboard paging through old detections would otherwise pay
+    that on every image. zipfile serializes reads on a shared handle, so one open archive
+    can serve several request threads.
+    """
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._open = OrderedDict()  # path -> (mtime, ZipFile)
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        with self._lock:
+            hit = self._open.get(path)
+            if hit is not None and hit[0] == mtime:
+                self._open.move_to_end(path)
+                return hit[1]
+            if hit is not None:
+                hit[1].close()
+            zf = zipfile.ZipFile(path)
+            self._open[path] = (mtime, zf)
+            while len(self._open) > self.maxsize:
+                _, (_, old) = self._open.popitem(last=False)
+                old.close()
+            return zf
+
+    def close(self):
+        with self._lock:
+            for _, zf in self._open.values():
+                zf.close()
+            self._open.clear()
+
+
+archives = _ArchiveCache()
+
+
+class _LegacyIndex:
+    """
+    key -> archive day of unsharded crops, which were packed by modification day. Read from
+    archive/legacy.idx (one "key<TAB>YYYY-MM-DD" line per crop) and reloaded when retention
+    appends to it, so resolving a legacy key never opens an archive it is not in.
+    """
+
+    def __init__(self):
+        self._stamp = None
+        self._days = {}
+        self._lock = threading.Lock()
+
+    def day(self, key, static_dir):
+        path = os.path.join(static_dir, ARCHIVE_DIR, LEGACY_INDEX)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        stamp = (path, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            if stamp != self._stamp:
+                days = {}
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        k, _, d = line.rstrip("\n").rpartition("\t")
+                        if k:
+                            days[k] = d
+                self._days, self._stamp = days, stamp
+            return self._days.get(key)
+
+
+legacy_index = _LegacyIndex()
+
+
+def index_legacy(day, keys, static_dir=None):
+    """Record that the unsharded crops keys were packed into day's archive (retention only)."""
+    directory = os.path.join(static_dir or settings.STATIC_IMAGE_DIR, ARCHIVE_DIR)
+    os.makedirs(directory, exist_ok=True)
+    name = day if isinstance(day, str) else day.strftime("%Y-%m-%d")
+    with open(os.path.join(directory, LEGACY_INDEX), "a", encoding="utf-8") as f:
+        f.writelines(f"{key}\t{name}\n" for key in keys)
+
+
+def _read_archived(key, static_dir):
+    m = _DAY_KEY.match(key)
+    day = "-".join(m.groups()) if m else legacy_index.day(key, static_dir)
+    if day is None:
+        return None
+    zf = archives.get(archive_path(day, static_dir))
+    if zf is None:
+        return None
+    try:
+        return zf.read(key)
+    except KeyError:
+        return None
+
+
+def read_image(image_path, static_dir=None):
+    """(bytes, media type) of a stored crop, from its file or its day's archive; FileNotFoundError if gone."""
+    static_dir = static_dir or settings.STATIC_IMAGE_DIR
+    key = image_key(image_path, static_dir)
+    if key is None:
+        raise FileNotFoundError(image_path)
+    path = os.path.join(static_dir, key)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        data = _read_archived(key, static_dir)
+        if data is None:
+            raise FileNotFoundError(image_path)
+    return data, MEDIA_TYPES.get(os.path.splitext(key)[1].lower(), "application/octet-stream")
+
+
+def thumbnail_path(key, static_dir=None):
+    root, _ = os.path.splitext(key)
+    return os.path.join(static_dir or settings.STATIC_IMAGE_DIR, root + ".thumb" + crop_ext())
+
+
+def read_thumbnail(image_path, static_dir=None):
+    """
+    (bytes, media type) of a CROP_THUMB_WIDTH-wide thumbnail. Made on first request rather
+    than at ingest, so the detection path never pays for thumbnails nobody looks at; cached
+    next to the crop while it is on disk. Crops already that narrow are served as they are.
+    """
+    import cv2
+    static_dir = static_dir or settings.STATIC_IMAGE_DIR
+    key = image_key(image_path, static_dir)
+    if key is None:
+        raise FileNotFoundError(image_path)
+    cached = thumbnail_path(key, static_dir)
+    if os.path.exists(cached):
+        with open(cached, "rb") as f:
+            return f.read(), MEDIA_TYPES[crop_ext()]
+    data, media_type = read_image(image_path, static_dir)
+    width = settings.CROP_THUMB_WIDTH
+    image = decode_image(data)
+    h, w = image.shape[:2]
+    if width <= 0 or w <= width:
+        return data, media_type
+    thumb = encode_image(cv2.resize(image, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA))
+    if os.path.isdir(os.path.dirname(cached)):
+        # only beside crops still on disk; packed days are not unpacked again for a thumbnail
+        _write_atomic(cached, thumb)
+    return thumb, MEDIA_TYPES[crop_ext()]
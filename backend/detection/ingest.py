@@ -0,0 +1,67 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from utils.config import settings
+from utils.logger import get_logger
+from detection.ocr import ocr_batch
+from detection.image_store import store_upload, decode_image
+from detection.session_manager import process_detection, process_detections
+
+logger = get_logger()
+
+# bounded pool for blocking ingest work (file I/O, image decode, OCR, sync SQLAlchemy)
+executor = ThreadPoolExecutor(max_workers=settings.INGEST_WORKERS, thread_name_prefix="ingest")
+_pending = None
+
+
+def _semaphore():
+    # created lazily so it binds to the running event loop
+    global _pending
+    if _pending is None:
+        _pending = asyncio.Semaphore(settings.INGEST_MAX_PENDING)
+    return _pending
+
+
+async def run_blocking(func, *args):
+    """Run func on the ingest pool; callers wait for a slot once INGEST_MAX_PENDING jobs are queued."""
+    async with _semaphore():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, func, *args)
+
+
+def ingest_upload(data, ocr_text, confidence, camera_id):
+    """
+    Blocking half of POST /detections/upload.
+    The uploaded bytes are stored once under a content-addressed name in the camera's day
+    shard and that file becomes Detection.image_path; the image is only decoded when the plate
+    still has to be OCR'd or the upload is not in CROP_FORMAT. A crop nobody could read gives
+    {"status": "no_text"}, as in ingest_batch; ValueError if the bytes are not an image.
+    """
+    image = None
+    ocr_text = (ocr_text or "").strip()
+    if not ocr_text:
+        # client did not read the plate: run the recognizer-only batch path on the crop
+        image = decode_image(data)
+        ocr = ocr_batch([image])[0]
+        ocr_text, confidence = ocr["text"], ocr["confidence"] * confidence
+        if not ocr_text:
+            return {"status": "no_text"}
+    path = store_upload(data, camera_id, image)
+    return process_detection(ocr_text, None, confidence, camera_id=camera_id, image_path=path)
+
+
+def ingest_batch(blobs, confidence, camera_id):
+    """
+    Blocking half of POST /detections/upload_batch: every crop is OCR'd in one batch and the
+    readable ones are written in one transaction. ValueError if any file is not an image.
+    """
+    arrays = [decode_image(data) for data in blobs]
+    paths = [store_upload(data, camera_id, image) for data, image in zip(blobs, arrays)]
+    results = [{"status": "no_text"} for _ in blobs]
+    items, slots = [], []
+    for i, (path, ocr) in enumerate(zip(paths, ocr_batch(arrays))):
+        if ocr["text"]:
+            items.append({"plate_text": ocr["text"], "confidence": ocr["confidence"] * confidence, "camera_id": camera_id, "image_path": path})
+            slots.append(i)
+    for i, res in zip(slots, process_detections(items) if items else []):
+        results[i] = res
+    return results
@@ -1,23 +1,189 @@
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from utils.config import settings
-import easyocr
-import pytesseract
+from utils.logger import get_logger
+from utils.metrics import ocr_seconds
+from detection.plate_format import match_plate
 from PIL import Image
 import numpy as np
 
-# initialize easyocr reader lazy
+logger = get_logger()
+
+# batch geometry: every crop is scaled to this height and padded to a shared width
+OCR_BATCH_HEIGHT = 64
+OCR_BATCH_MAX_WIDTH = 512
+
+# engines are imported on first use and only for what is configured: easyocr pulls in torch
 _reader = None
+_reader_lock = threading.Lock()
 def get_reader():
     global _reader
     if _reader is None:
-        _reader = easyocr.Reader(['en'])
+        with _reader_lock:
+            if _reader is None:
+                import easyocr
+                _reader = easyocr.Reader(['en'])
     return _reader
 
-def ocr_image(image) -> dict:
+TESSERACT_WHITELIST = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-"
+
+_fast_available = True
+_fast_pool = None
+_fast_pool_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {
+    "crops": 0,
+    "fast_attempts": 0,
+    "fast_hits": 0,
+    "fast_errors": 0,
+    "heavy_calls": 0,
+    "invalid": 0,
+    "corrected": 0,
+    "fast_ms_total": 0.0,
+    "heavy_ms_total": 0.0,
+}
+
+
+def _count(key, value=1):
+    with _stats_lock:
+        _stats[key] += value
+
+
+def ocr_stats():
+    """Fast-path hit rate and per-engine latency."""
+    with _stats_lock:
+        s = dict(_stats)
+    s["fast_hit_rate"] = s["fast_hits"] / s["crops"] if s["crops"] else 0.0
+    s["avg_fast_ms"] = s["fast_ms_total"] / s["fast_attempts"] if s["fast_attempts"] else 0.0
+    s["avg_heavy_ms"] = s["heavy_ms_total"] / s["heavy_calls"] if s["heavy_calls"] else 0.0
+    return s
+
+
+def _deskew(gray):
+    """Rotate a plate crop so its text line is horizontal (small angles only)."""
+    import cv2
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    if np.count_nonzero(mask) > mask.size // 2:
+        mask = 255 - mask  # light text on a dark plate
+    pts = cv2.findNonZero(mask)
+    if pts is None or len(pts) < 10:
+        return gray
+    angle = cv2.minAreaRect(pts)[2]
+    if angle > 45:
+        angle -= 90
+    elif angle < -45:
+        angle += 90
+    if abs(angle) < 0.5 or abs(angle) > 15:
+        return gray
+    h, w = gray.shape
+    m = cv2.getRotationMatrix2D((w / 2.0, h / 2.0), angle, 1.0)
+    return cv2.warpAffine(gray, m, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def preprocess_plate(image, height=None):
     """
-    image: numpy array (BGR) or PIL
-    returns dict {text, confidence}
+    Canonical crop for the fast decoder: grayscale, resized to OCR_CANONICAL_HEIGHT,
+    deskewed, Otsu-binarized to dark text on white and given a small white border.
+    """
+    import cv2
+    height = height or settings.OCR_CANONICAL_HEIGHT
+    gray = _to_gray(image)
+    h, w = gray.shape[:2]
+    gray = cv2.resize(gray, (max(1, int(round(w * height / float(h)))), height), interpolation=cv2.INTER_CUBIC)
+    gray = _deskew(gray)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    if np.count_nonzero(binary) < binary.size // 2:
+        binary = 255 - binary
+    pad = height // 8
+    return cv2.copyMakeBorder(binary, pad, pad, pad, pad, cv2.BORDER_CONSTANT, value=255)
+
+
+def _tesseract(image, config="--psm 7"):
+    """tesseract text plus its mean word confidence (0-1)."""
+    import pytesseract
+    data = pytesseract.image_to_data(image, config=config, output_type=pytesseract.Output.DICT)
+    words, confs = [], []
+    for text, conf in zip(data["text"], data["conf"]):
+        conf = float(conf)
+        if text.strip() and conf >= 0:
+            words.append(text)
+            confs.append(conf)
+    if not words:
+        return {"text": "", "confidence": 0.0}
+    return {"text": " ".join(words), "confidence": sum(confs) / len(confs) / 100.0}
+
+
+def _with_format(res, engine):
+    """Normalize and fit to the plate formats; canonical text when a format matches."""
+    text = normalize_plate(res["text"])
+    match = match_plate(text)
+    if match is not None:
+        text = match[0]
+        if match[1]:
+            _count("corrected")
+    return {"text": text, "confidence": float(res["confidence"]), "engine": engine, "valid": match is not None}
+
+
+def _fast_enabled():
+    # with OCR_ENGINE=tesseract the "fast" path would just run tesseract twice
+    return settings.OCR_FAST_PATH and _fast_available and settings.OCR_ENGINE == "easyocr"
+
+
+def _fast_decode(image):
+    """Tesseract on the preprocessed crop; None when the fast path is off or tesseract is unusable."""
+    global _fast_available
+    if not _fast_enabled():
+        return None
+    _count("fast_attempts")
+    t0 = time.perf_counter()
+    try:
+        res = _tesseract(preprocess_plate(image), f"--psm 7 -c tessedit_char_whitelist={TESSERACT_WHITELIST}")
+    except Exception as e:
+        _count("fast_errors")
+        if isinstance(e, (EnvironmentError, AttributeError)):
+            # tesseract binary missing (or a pytesseract without image_to_data): stop trying
+            _fast_available = False
+            logger.warning("OCR fast path disabled: %s", e)
+        return None
+    finally:
+        _count("fast_ms_total", (time.perf_counter() - t0) * 1000.0)
+    return _with_format(res, "fast")
+
+
+def _fast_decode_many(crops):
+    """
+    _fast_decode over a batch. Each call is a tesseract subprocess, so they run side by side
+    on OCR_FAST_WORKERS threads instead of one after another ahead of the easyocr batch.
     """
+    global _fast_pool
+    if not _fast_enabled():
+        return [None] * len(crops)
+    if len(crops) == 1 or settings.OCR_FAST_WORKERS <= 1:
+        return [_fast_decode(c) for c in crops]
+    if _fast_pool is None:
+        with _fast_pool_lock:
+            if _fast_pool is None:
+                _fast_pool = ThreadPoolExecutor(settings.OCR_FAST_WORKERS, thread_name_prefix="ocr-fast")
+    return list(_fast_pool.map(_fast_decode, crops))
+
+
+def _fast_accepted(res):
+    return res is not None and res["valid"] and res["confidence"] >= settings.OCR_FAST_MIN_CONFIDENCE
+
+
+def _pick(fast, heavy):
+    """Heavy engine result, unless only the fast one fits a plate format."""
+    if not heavy["valid"] and fast is not None and fast["valid"]:
+        return fast
+    if not heavy["valid"]:
+        _count("invalid")
+    return heavy
+
+
+def _engine_ocr(image) -> dict:
+    """The configured (heavy) engine on the raw crop."""
     if settings.OCR_ENGINE == "easyocr":
         reader = get_reader()
         # convert to RGB
@@ -33,14 +199,128 @@ def ocr_image(image) -> dict:
         confidences = [r[2] for r in results]
         text = " ".join(texts)
         conf = max(confidences)
-        return {"text": normalize_plate(text), "confidence": float(conf)}
+        return {"text": text, "confidence": float(conf)}
     else:
         if isinstance(image, np.ndarray):
             pil = Image.fromarray(image[:,:,::-1])
         else:
             pil = image
-        raw = pytesseract.image_to_string(pil, config="--psm 7")
-        return {"text": normalize_plate(raw), "confidence": 0.5}
+        return _tesseract(pil)
+
+def warm_up():
+    """Load the configured engine and run it once on a blank crop, outside the request path."""
+    global _fast_available
+    blank = np.full((OCR_BATCH_HEIGHT, OCR_BATCH_HEIGHT * 4), 255, np.uint8)
+    if settings.OCR_ENGINE != "easyocr":
+        _tesseract(blank)
+    elif _fast_enabled():
+        try:
+            _tesseract(preprocess_plate(blank))
+        except Exception as e:
+            _fast_available = False
+            logger.warning("OCR fast path disabled: %s", e)
+    if settings.OCR_ENGINE == "easyocr":
+        h, w = blank.shape
+        get_reader().recognize(blank, horizontal_list=[[0, w, 0, h]], free_list=[], detail=1, paragraph=False)
+
+def ocr_image(image) -> dict:
+    """
+    image: numpy array (BGR) or PIL
+    returns dict {text, confidence, engine, valid}
+    With OCR_FAST_PATH (easyocr only) tesseract runs first on the preprocessed crop, and
+    easyocr only when that text does not fit a plate format (PLATE_FORMATS) or its
+    confidence is below OCR_FAST_MIN_CONFIDENCE.
+    """
+    _count("crops")
+    start = time.perf_counter()
+    fast = _fast_decode(image)
+    if _fast_accepted(fast):
+        _count("fast_hits")
+        ocr_seconds.observe(time.perf_counter() - start, "fast")
+        return fast
+    t0 = time.perf_counter()
+    heavy = _with_format(_engine_ocr(image), settings.OCR_ENGINE)
+    _count("heavy_calls")
+    _count("heavy_ms_total", (time.perf_counter() - t0) * 1000.0)
+    ocr_seconds.observe(time.perf_counter() - start, settings.OCR_ENGINE)
+    return _pick(fast, heavy)
+
+def _to_gray(image):
+    import cv2
+    if not isinstance(image, np.ndarray):
+        image = np.array(image.convert("RGB"))[:, :, ::-1]
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+def prepare_batch(crops, height=OCR_BATCH_HEIGHT, max_width=OCR_BATCH_MAX_WIDTH):
+    """
+    Resize every crop to a common height (keeping aspect) and right-pad to a shared width.
+    Returns a (N, height, width) uint8 array; empty crops become blank rows.
+    """
+    import cv2
+    resized = []
+    for crop in crops:
+        gray = _to_gray(crop) if crop is not None and np.size(crop) else np.zeros((height, 1), np.uint8)
+        h, w = gray.shape[:2]
+        new_w = max(1, min(max_width, int(round(w * height / float(h)))))
+        resized.append(cv2.resize(gray, (new_w, height), interpolation=cv2.INTER_LINEAR))
+    width = max((r.shape[1] for r in resized), default=1)
+    batch = np.zeros((len(resized), height, width), np.uint8)
+    for i, r in enumerate(resized):
+        batch[i, :, :r.shape[1]] = r
+        # pad with the crop's edge colour so the recognizer does not read the border as a glyph
+        batch[i, :, r.shape[1]:] = r[:, -1:]
+    return batch
+
+def ocr_batch(crops) -> list:
+    """
+    crops: list of plate crops (BGR numpy arrays or PIL)
+    returns list of dicts {text, confidence, engine, valid}, one per crop, in input order.
+    Crops the fast path (if on) accepts are done; the rest go to the configured engine. easyocr gets
+    a single recognize() call for all of them (recognizer only: crops are already tight plate
+    boxes, so the text detector is skipped). tesseract has no batch mode and is called per crop.
+    """
+    if not crops:
+        return []
+    if settings.OCR_ENGINE != "easyocr":
+        return [ocr_image(c) for c in crops]
+    _count("crops", len(crops))
+    start = time.perf_counter()
+    fast = _fast_decode_many(crops)
+    out = [None] * len(crops)
+    pending = []
+    for i, res in enumerate(fast):
+        if _fast_accepted(res):
+            _count("fast_hits")
+            out[i] = res
+        else:
+            pending.append(i)
+    fast_each = (time.perf_counter() - start) / len(crops)
+    for _ in range(len(crops) - len(pending)):
+        ocr_seconds.observe(fast_each, "fast")
+    if not pending:
+        return out
+    t0 = time.perf_counter()
+    batch = prepare_batch([crops[i] for i in pending])
+    n, h, w = batch.shape
+    # stack the padded crops into one tall image and hand the recognizer one box per crop
+    canvas = batch.reshape(n * h, w)
+    boxes = [[0, w, i * h, (i + 1) * h] for i in range(n)]
+    results = get_reader().recognize(canvas, horizontal_list=boxes, free_list=[], batch_size=n, detail=1, paragraph=False)
+    heavy = [{"text": "", "confidence": 0.0} for _ in range(n)]
+    for box, text, conf in results:
+        idx = min(n - 1, int(box[0][1]) // h)
+        heavy[idx] = {"text": text, "confidence": float(conf)}
+    _count("heavy_calls", n)
+    _count("heavy_ms_total", (time.perf_counter() - t0) * 1000.0)
+    # one recognize() call for the whole batch: each crop is charged its share
+    heavy_each = fast_each + (time.perf_counter() - t0) / n
+    for _ in range(n):
+        ocr_seconds.observe(heavy_each, "easyocr")
+    for j, i in enumerate(pending):
+        out[i] = _pick(fast[i], _with_format(heavy[j], "easyocr"))
+    return out
 
 def normalize_plate(raw_text: str) -> str:
     # basic normalization: remove non alnum and spaces, uppercase
@@ -0,0 +1,104 @@
+import os
+import cv2
+import numpy as np
+from utils.logger import get_logger
+
+logger = get_logger()
+
+
+def int8_path(path):
+    root, ext = os.path.splitext(path)
+    return f"{root}.int8{ext}"
+
+
+def quantize_int8(path):
+    """
+    Return the INT8 variant of an ONNX model: "<name>.int8.onnx" next to it if it exists,
+    otherwise it is produced with onnxruntime's dynamic quantization (weights to int8).
+    """
+    out = int8_path(path)
+    if os.path.exists(out):
+        return out
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    logger.info("Quantizing %s to INT8", path)
+    quantize_dynamic(path, out, weight_type=QuantType.QInt8)
+    return out
+
+
+class OnnxPlateModel:
+    """
+    Exported YOLO plate model (v5 or v8 output layout) run through onnxruntime, or through
+    cv2.dnn when onnxruntime is not installed. Preprocessing (the caller letterboxes), score
+    filtering and NMS are done here, so neither torch nor ultralytics is imported.
+    infer(images) takes letterboxed BGR images and returns [(xyxy boxes, scores)] in the
+    same letterboxed coordinates.
+    """
+
+    def __init__(self, path, input_size=640, conf_threshold=0.25, iou_threshold=0.45, threads=0, int8=False):
+        if int8:
+            try:
+                path = quantize_int8(path)
+            except ImportError:
+                logger.warning("onnxruntime.quantization not available, using the float model")
+        self.path = path
+        self.input_size = input_size
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.session = None
+        self.net = None
+        try:
+            import onnxruntime as ort
+            opts = ort.SessionOptions()
+            opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if threads:
+                opts.intra_op_num_threads = threads
+                opts.inter_op_num_threads = 1
+            self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+            inp = self.session.get_inputs()[0]
+            self.input_name = inp.name
+            # a symbolic or missing batch dimension means the export accepts any batch size
+            self.dynamic_batch = not isinstance(inp.shape[0], int)
+            self.engine = "onnxruntime"
+        except ImportError:
+            if threads:
+                cv2.setNumThreads(threads)
+            self.net = cv2.dnn.readNetFromONNX(path)
+            self.dynamic_batch = False
+            self.engine = "cv2.dnn"
+        logger.info("Loaded ONNX plate model %s via %s", path, self.engine)
+
+    def _blob(self, images):
+        return cv2.dnn.blobFromImages(images, scalefactor=1 / 255.0, size=(self.input_size, self.input_size), swapRB=True, crop=False)
+
+    def _forward(self, blob):
+        if self.session is not None:
+            return self.session.run(None, {self.input_name: blob})[0]
+        self.net.setInput(blob)
+        return self.net.forward()
+
+    def infer(self, images):
+        if not images:
+            return []
+        if self.dynamic_batch:
+            preds = self._forward(self._blob(images))
+        else:
+            preds = np.concatenate([self._forward(self._blob([img])) for img in images], axis=0)
+        return [self._postprocess(p) for p in preds]
+
+    def _postprocess(self, pred):
+        """pred: (4+nc, N) for YOLOv8 exports or (N, 5+nc) for YOLOv5 exports."""
+        if pred.shape[0] < pred.shape[1]:
+            pred = pred.T  # v8: channels first
+            scores = pred[:, 4:].max(axis=1)
+        else:
+            scores = pred[:, 4] * (pred[:, 5:].max(axis=1) if pred.shape[1] > 5 else 1.0)
+        keep = scores >= self.conf_threshold
+        pred, scores = pred[keep], scores[keep]
+        if not len(pred):
+            return np.zeros((0, 4), np.float32), np.zeros((0,), np.float32)
+        cx, cy, w, h = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+        boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+        idx = cv2.dnn.NMSBoxes(np.stack([boxes[:, 0], boxes[:, 1], w, h], axis=1).tolist(), scores.tolist(),
+                               self.conf_threshold, self.iou_threshold)
+        idx = np.array(idx, dtype=np.int64).reshape(-1)
+        return boxes[idx].astype(np.float32), scores[idx].astype(np.float32)
@@ -0,0 +1,92 @@
+import queue
+import threading
+from utils.logger import get_logger
+
+logger = get_logger()
+
+
+class OwnerResolver:
+    """
+    Background job queue for owner lookups.
+    submit(plate) is non-blocking and de-duplicated per plate; worker threads run
+    handler(plate) (lookup + linking the owner to the plate's active sessions). Concurrency
+    and rate limits towards the excise site live in the excise client, so the worker count
+    only bounds how many lookups wait there at once.
+    """
+
+    def __init__(self, handler, workers=4, maxsize=1000):
+        self.handler = handler
+        self.workers = workers
+        self._queue = queue.Queue(maxsize)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stop = threading.Event()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for i in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"owner-resolver-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        for _ in self._threads:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def submit(self, plate):
+        if not self._threads:
+            self.start()
+        with self._lock:
+            if plate in self._pending:
+                return False
+            self._pending.add(plate)
+        try:
+            self._queue.put_nowait(plate)
+        except queue.Full:
+            with self._lock:
+                self._pending.discard(plate)
+            self.dropped += 1
+            logger.warning("Owner lookup queue full, dropping %s", plate)
+            return False
+        self.submitted += 1
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            plate = self._queue.get()
+            if plate is None:
+                break
+            try:
+                self.handler(plate)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error("Owner resolution failed for %s: %s", plate, e)
+            finally:
+                with self._lock:
+                    self._pending.discard(plate)
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "workers": len(self._threads),
+        }
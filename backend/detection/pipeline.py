@@ -0,0 +1,260 @@
+import threading
+import time
+from collections import deque
+from utils.logger import get_logger
+
+logger = get_logger()
+
+
+class StageQueue:
+    """
+    Bounded FIFO between two pipeline stages.
+    When full, the oldest item is evicted instead of blocking the producer, and
+    items older than max_age seconds are discarded on read, so a slow consumer
+    sees fresh frames rather than a growing backlog. Items handed out by get_many
+    count as in flight until the consumer calls done(), so an empty queue with
+    nothing in flight means the downstream stage has finished with everything.
+    With lossless=True put waits for room instead of evicting (for items that must
+    not be lost); only a put into a closed queue drops, and that is logged.
+    """
+
+    def __init__(self, name, maxsize, max_age=None, lossless=False):
+        self.name = name
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self.lossless = lossless
+        self.dropped = 0
+        self.put_count = 0
+        self.in_flight = 0
+        self.closed = False
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)  # items available
+        self._room = threading.Condition(self._lock)  # space freed (lossless puts)
+
+    def put(self, item):
+        """Queue item; False if it was dropped because the queue is closed."""
+        with self._lock:
+            if self.lossless:
+                while len(self._items) >= self.maxsize and not self.closed:
+                    self._room.wait(0.5)
+                if self.closed:
+                    self.dropped += 1
+                    logger.warning("Queue %s closed, dropping %s", self.name, _describe(item))
+                    return False
+            elif len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append((time.monotonic(), item))
+            self.put_count += 1
+            self._cond.notify()
+            return True
+
+    def get_many(self, max_items=1, timeout=0.5):
+        """Wait up to timeout for at least one item, then drain up to max_items without waiting."""
+        with self._lock:
+            if not self._items:
+                self._cond.wait(timeout)
+            out = []
+            now = time.monotonic()
+            while self._items and len(out) < max_items:
+                ts, item = self._items.popleft()
+                if self.max_age is not None and now - ts > self.max_age:
+                    self.dropped += 1
+                    continue
+                out.append(item)
+            # counted under the same lock as the pop, so idle() never sees an item in neither place
+            self.in_flight += len(out)
+            if out:
+                self._room.notify_all()
+            return out
+
+    def done(self, n=1):
+        with self._lock:
+            self.in_flight -= n
+
+    def drain(self):
+        """Remove and return whatever is still queued (e.g. lossless items left at shutdown)."""
+        with self._lock:
+            items = [item for _, item in self._items]
+            self._items.clear()
+            return items
+
+    def close(self):
+        """Wake every waiting consumer and producer; later lossless puts drop instead of waiting."""
+        with self._lock:
+            self.closed = True
+            self._cond.notify_all()
+            self._room.notify_all()
+
+    def __len__(self):
+        return len(self._items)
+
+
+def _describe(item):
+    if isinstance(item, dict) and "plate" in item:
+        return f"plate {item['plate']}"
+    return type(item).__name__
+
+
+class Stage:
+    """
+    A named pipeline step run by one or more worker threads.
+    func receives one item (or a list of up to batch_size items when batch_size > 1)
+    and returns an iterable of outputs for outbox, or None. A stage without an
+    inbox is a source: func is called with no arguments in a loop.
+    """
+
+    def __init__(self, name, func, inbox=None, outbox=None, workers=1, batch_size=1):
+        self.name = name
+        self.func = func
+        self.inbox = inbox
+        self.outbox = outbox
+        self.workers = workers
+        self.batch_size = batch_size
+        self.processed = 0
+        self.emitted = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self, stop_event):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, args=(stop_event,), name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def join(self, timeout=None):
+        for t in self._threads:
+            t.join(timeout)
+
+    def _run(self, stop_event):
+        while not stop_event.is_set():
+            if self.inbox is None:
+                items = [None]
+            else:
+                items = self.inbox.get_many(self.batch_size)
+                if not items:
+                    continue
+            t0 = time.perf_counter()
+            try:
+                if self.inbox is None:
+                    outputs = self.func()
+                elif self.batch_size > 1:
+                    outputs = self.func(items)
+                else:
+                    outputs = self.func(items[0])
+            except Exception as e:
+                outputs = None
+                with self._lock:
+                    self.errors += 1
+                logger.exception("Stage %s failed: %s", self.name, e)
+            elapsed = time.perf_counter() - t0
+            n_out = 0
+            try:
+                if outputs and self.outbox is not None:
+                    for out in outputs:
+                        self.outbox.put(out)
+                        n_out += 1
+            finally:
+                if self.inbox is not None:
+                    # after the outputs are queued, so the items are never out of sight of idle()
+                    self.inbox.done(len(items))
+            with self._lock:
+                if self.inbox is not None or outputs:
+                    self.processed += len(items)
+                self.emitted += n_out
+                self.busy_seconds += elapsed
+
+
+class Pipeline:
+    """Wires queues and stages together and periodically logs per-stage depth and throughput."""
+
+    def __init__(self, report_interval=10.0):
+        self.report_interval = report_interval
+        self.queues = []
+        self.stages = []
+        self._stop = threading.Event()
+        self._drain = threading.Event()
+        self._reporters = []
+        self._last_report = None
+        self._last_counts = {}
+
+    def queue(self, name, maxsize, max_age=None, lossless=False):
+        q = StageQueue(name, maxsize, max_age=max_age, lossless=lossless)
+        self.queues.append(q)
+        return q
+
+    def stage(self, name, func, inbox=None, outbox=None, workers=1, batch_size=1):
+        s = Stage(name, func, inbox=inbox, outbox=outbox, workers=workers, batch_size=batch_size)
+        self.stages.append(s)
+        return s
+
+    def add_reporter(self, name, func):
+        """Extra stats (a dict-returning callable) logged alongside the stage report."""
+        self._reporters.append((name, func))
+
+    def start(self):
+        self._stop.clear()
+        self._last_report = time.monotonic()
+        for s in self.stages:
+            s.start(self._stop)
+
+    def finish(self):
+        """Ask run_forever to return once every queue is empty and no stage is mid-item (end of a replay)."""
+        self._drain.set()
+
+    def idle(self):
+        return all(len(q) == 0 and q.in_flight == 0 for q in self.queues)
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        for q in self.queues:
+            q.close()
+        for s in self.stages:
+            s.join(timeout)
+
+    def stats(self):
+        """Per-stage counters plus throughput since the previous call."""
+        now = time.monotonic()
+        window = max(now - (self._last_report or now), 1e-6)
+        out = {}
+        for s in self.stages:
+            prev = self._last_counts.get(s.name, 0)
+            out[s.name] = {
+                "queue": s.inbox.name if s.inbox is not None else None,
+                "queue_depth": len(s.inbox) if s.inbox is not None else 0,
+                "dropped": s.inbox.dropped if s.inbox is not None else 0,
+                "processed": s.processed,
+                "emitted": s.emitted,
+                "errors": s.errors,
+                "throughput": (s.processed - prev) / window,
+                "avg_ms": (s.busy_seconds / s.processed * 1000.0) if s.processed else 0.0,
+            }
+            self._last_counts[s.name] = s.processed
+        self._last_report = now
+        return out
+
+    def report(self):
+        for name, st in self.stats().items():
+            logger.info(
+                "stage=%s depth=%d dropped=%d processed=%d rate=%.1f/s avg=%.1fms errors=%d",
+                name, st["queue_depth"], st["dropped"], st["processed"], st["throughput"], st["avg_ms"], st["errors"],
+            )
+        for name, func in self._reporters:
+            logger.info("%s %s", name, " ".join(f"{k}={round(v, 3) if isinstance(v, float) else v}" for k, v in func().items()))
+
+    def run_forever(self):
+        self.start()
+        next_report = time.monotonic() + self.report_interval
+        try:
+            while not self._stop.wait(0.2):
+                if self._drain.is_set() and self.idle():
+                    break
+                if time.monotonic() >= next_report:
+                    self.report()
+                    next_report = time.monotonic() + self.report_interval
+        finally:
+            self.stop()
+            self.report()
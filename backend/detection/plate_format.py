@@ -0,0 +1,95 @@
+import re
+from utils.config import settings
+
+# characters OCR engines commonly confuse; which way a character is corrected depends on
+# whether the plate format expects a letter or a digit at that position
+LETTER_TO_DIGIT = {"O": "0", "Q": "0", "D": "0", "I": "1", "L": "1", "B": "8", "S": "5", "Z": "2", "G": "6"}
+DIGIT_TO_LETTER = {"0": "O", "1": "I", "8": "B", "5": "S", "2": "Z", "6": "G"}
+
+_CLASSES = frozenset("LDA")  # letter, digit, either
+
+
+class PlateFormat:
+    """
+    One plate layout written as a template: L = letter, D = digit, A = either, anything else
+    (usually "-" or " ") is a separator. "LLL-DDDD" fits ABC1234 as well as ABC-1234, so
+    the separator is optional in OCR output but always emitted in the canonical form.
+    """
+
+    def __init__(self, template, region=""):
+        self.template = template
+        self.region = region
+        self.slots = [c for c in template if c in _CLASSES]
+
+    def fit(self, compact):
+        """
+        compact: plate text without separators. Returns (canonical text, corrections) when the
+        text can be made to match this format by positional swaps, else None.
+        """
+        if len(compact) != len(self.slots):
+            return None
+        out = []
+        fixes = 0
+        for ch, slot in zip(compact, self.slots):
+            if slot == "L" and ch.isdigit():
+                ch, fixes = DIGIT_TO_LETTER.get(ch), fixes + 1
+            elif slot == "D" and ch.isalpha():
+                ch, fixes = LETTER_TO_DIGIT.get(ch), fixes + 1
+            if ch is None:
+                return None
+            out.append(ch)
+        text, i = [], 0
+        for c in self.template:
+            if c in _CLASSES:
+                text.append(out[i])
+                i += 1
+            else:
+                text.append(c)
+        return "".join(text), fixes
+
+    def __repr__(self):
+        return f"PlateFormat({self.region + ':' if self.region else ''}{self.template})"
+
+
+def parse_formats(spec=None):
+    """
+    PLATE_FORMATS: comma separated templates, optionally prefixed with a region,
+    e.g. "PK:LLL-DDDD,PK:LLL-DDD,AE:L-DDDDD". Order breaks ties between equally good fits.
+    """
+    spec = settings.PLATE_FORMATS if spec is None else spec
+    formats = []
+    for item in (s.strip() for s in spec.split(",")):
+        if not item:
+            continue
+        region, sep, template = item.rpartition(":")
+        formats.append(PlateFormat(template, region if sep else ""))
+    return formats
+
+
+_formats = None
+
+
+def get_formats():
+    global _formats
+    if _formats is None:
+        _formats = parse_formats()
+    return _formats
+
+
+def match_plate(text, formats=None):
+    """
+    Fit normalized OCR text to the configured plate formats, correcting O/0, I/1, B/8 style
+    confusions by position. Returns (canonical text, corrections, format), or None when no
+    format fits.
+    """
+    compact = re.sub(r"[^A-Z0-9]", "", (text or "").upper())
+    if not compact:
+        return None
+    best = None
+    for fmt in (formats if formats is not None else get_formats()):
+        fit = fmt.fit(compact)
+        if fit is not None and (best is None or fit[1] < best[1]):
+            best = (fit[0], fit[1], fmt)
+            if fit[1] == 0:
+                break
+    return best
@@ -0,0 +1,193 @@
+import re
+import threading
+
+# OCR confusions folded onto one character, so "ABC-1O3" and "ABC-103" share a normalized key
+_FOLD = str.maketrans({"O": "0", "Q": "0", "D": "0", "I": "1", "L": "1", "B": "8", "S": "5", "Z": "2", "G": "6"})
+
+
+def compact(plate):
+    """Uppercase letters and digits only: "abc 123" and "ABC-123" are the same plate."""
+    return re.sub(r"[^A-Z0-9]", "", (plate or "").upper())
+
+
+def fold(plate):
+    return compact(plate).translate(_FOLD)
+
+
+def _within_one(a, b):
+    """0, 1, or 2 meaning "more than one edit apart"; linear instead of the DP table."""
+    if a == b:
+        return 0
+    la, lb = len(a), len(b)
+    if la > lb:
+        a, b, la, lb = b, a, lb, la
+    if lb - la > 1:
+        return 2
+    i = 0
+    while i < la and a[i] == b[i]:
+        i += 1
+    if la == lb:
+        return 1 if a[i + 1:] == b[i + 1:] else 2
+    return 1 if a[i:] == b[i + 1:] else 2
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance, or limit + 1 as soon as it is known to exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if limit <= 1:
+        return min(_within_one(a, b), limit + 1)
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        best = i
+        for j, cb in enumerate(b, 1):
+            d = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            cur.append(d)
+            best = min(best, d)
+        if best > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+
+def _deletes(key, depth):
+    """key plus every string reachable by deleting up to depth characters from it."""
+    out = {key}
+    frontier = {key}
+    for _ in range(depth):
+        frontier = {k[:i] + k[i + 1:] for k in frontier for i in range(len(k))}
+        out |= frontier
+    return out
+
+
+class DeletionIndex:
+    """
+    Symmetric-deletion index over edit distance (the SymSpell scheme): every key is stored
+    under each of its variants with up to max_distance characters deleted. Two keys within
+    max_distance edits share at least one variant, so a query only verifies the handful of
+    candidates under its own variants instead of walking the whole set, which keeps lookups
+    at microseconds in pure Python. Plates are short, so the variant count stays small.
+    """
+
+    def __init__(self, max_distance=1):
+        self.max_distance = max_distance
+        self._variants = {}
+        self._keys = set()
+
+    def add(self, key):
+        if key in self._keys:
+            return
+        self._keys.add(key)
+        for v in _deletes(key, self.max_distance):
+            bucket = self._variants.get(v)
+            if bucket is None:
+                self._variants[v] = bucket = set()
+            bucket.add(key)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def search(self, key, radius):
+        """[(distance, key)] for every stored key within radius (<= max_distance) of key."""
+        radius = min(radius, self.max_distance)
+        seen = set()
+        out = []
+        for v in _deletes(key, radius):
+            for cand in self._variants.get(v, ()):
+                if cand in seen:
+                    continue
+                seen.add(cand)
+                d = edit_distance(key, cand, radius)
+                if d <= radius:
+                    out.append((d, cand))
+        return out
+
+
+class ResidentIndex:
+    """
+    Registered resident plates, held in memory for the detection hot path.
+    match() tries, in order: the exact compact plate, the OCR-confusion-folded plate, and a
+    deletion-index search for plates within max_distance edits. A fuzzy match is only
+    reported when a single resident is closest, so OCR noise cannot land a visitor on an
+    arbitrary resident.
+    """
+
+    def __init__(self, max_distance=1):
+        self.max_distance = max_distance
+        self.loaded = False
+        self.max_id = 0
+        self._exact = {}
+        self._folded = {}
+        self._fuzzy = DeletionIndex(max_distance)
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = {"exact": 0, "normalized": 0, "fuzzy": 0}
+
+    def load(self, rows):
+        """rows: (resident_id, plate_number); replaces the current contents."""
+        exact, folded, fuzzy, max_id = {}, {}, DeletionIndex(self.max_distance), 0
+        for resident_id, plate in rows:
+            self._insert(exact, folded, fuzzy, resident_id, plate)
+            max_id = max(max_id, resident_id)
+        with self._lock:
+            self._exact, self._folded, self._fuzzy = exact, folded, fuzzy
+            self.max_id = max_id
+            self.loaded = True
+
+    @staticmethod
+    def _insert(exact, folded, fuzzy, resident_id, plate):
+        key = compact(plate)
+        if not key:
+            return
+        exact[key] = resident_id
+        folded.setdefault(fold(key), set()).add(resident_id)
+        fuzzy.add(fold(key))
+
+    def add(self, resident_id, plate):
+        with self._lock:
+            self._insert(self._exact, self._folded, self._fuzzy, resident_id, plate)
+            self.max_id = max(self.max_id, resident_id)
+
+    def match(self, plate, max_distance=None):
+        """(resident_id, kind, distance) with kind exact | normalized | fuzzy, or None."""
+        max_distance = self.max_distance if max_distance is None else max_distance
+        key = compact(plate)
+        # add() mutates the maps and deletion buckets in place from the residents API thread;
+        # a lookup is microseconds, so ingest threads simply take the same lock
+        with self._lock:
+            self.lookups += 1
+            if not key:
+                return None
+            return self._match(key, max_distance)
+
+    def _match(self, key, max_distance):
+        resident_id = self._exact.get(key)
+        if resident_id is not None:
+            self.hits["exact"] += 1
+            return resident_id, "exact", 0
+        folded = fold(key)
+        ids = self._folded.get(folded)
+        if ids and len(ids) == 1:
+            self.hits["normalized"] += 1
+            return next(iter(ids)), "normalized", 0
+        if max_distance <= 0 or ids:
+            return None
+        found = self._fuzzy.search(folded, max_distance)
+        if not found:
+            return None
+        best = min(d for d, _ in found)
+        closest = set()
+        for d, k in found:
+            if d == best:
+                closest |= self._folded.get(k, set())
+        if len(closest) != 1:
+            return None
+        self.hits["fuzzy"] += 1
+        return next(iter(closest)), "fuzzy", best
+
+    def __len__(self):
+        return len(self._exact)
+
+    def stats(self):
+        return {"residents": len(self._exact), "lookups": self.lookups, **{f"{k}_hits": v for k, v in self.hits.items()}}
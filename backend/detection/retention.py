@@ -0,0 +1,279 @@
+"""
+Crop retention.
+
+    cd backend && python -m detection.retention            # one pass, e.g. from cron
+    python -m detection.retention --days 7 --mode delete
+
+Day shards of STATIC_IMAGE_DIR older than CROP_RETENTION_DAYS are either packed into one
+archive per day (CROP_RETENTION_MODE=pack: archive/YYYY-MM-DD.zip, stored uncompressed since
+the crops already are, members keyed by their path under STATIC_IMAGE_DIR so
+image_store.read_image still resolves every Detection.image_path) or deleted
+(CROP_RETENTION_MODE=delete). Unsharded files from before sharding are handled by
+modification day, and archive/legacy.idx records which archive each went into. Archives older than CROP_ARCHIVE_RETENTION_DAYS are deleted (0 keeps them).
+A pass holds an exclusive lock on archive/.retention.lock; every API worker runs retention,
+and a worker that finds the lock taken skips its pass.
+"""
+import argparse
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import date, datetime, timedelta
+from utils.config import settings
+from utils.logger import get_logger
+from detection.image_store import ARCHIVE_DIR, archive_path, archives, index_legacy
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+    import msvcrt
+
+logger = get_logger()
+LOCK_FILE = ".retention.lock"
+
+
+@contextlib.contextmanager
+def _exclusive(directory):
+    """
+    Non-blocking exclusive lock on directory's lock file; yields False when another process
+    (every uvicorn worker starts its own retention thread) already holds it.
+    """
+    os.makedirs(directory, exist_ok=True)
+    fd = os.open(os.path.join(directory, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            yield False
+            return
+        yield True  # released when fd is closed
+    finally:
+        os.close(fd)
+
+
+def _day_dirs(root):
+    """(date, path) of every YYYY/MM/DD shard under root."""
+    out = []
+    for y in sorted(os.listdir(root)):
+        if not (y.isdigit() and len(y) == 4) or not os.path.isdir(os.path.join(root, y)):
+            continue
+        for m in sorted(os.listdir(os.path.join(root, y))):
+            month = os.path.join(root, y, m)
+            if not (m.isdigit() and os.path.isdir(month)):
+                continue
+            for d in sorted(os.listdir(month)):
+                path = os.path.join(month, d)
+                if d.isdigit() and os.path.isdir(path):
+                    try:
+                        out.append((date(int(y), int(m), int(d)), path))
+                    except ValueError:
+                        continue
+    return out
+
+
+def _crop_files(directory, root):
+    """(path, key) of the crops under directory; thumbnails and half-written files are skipped."""
+    for dirpath, _, names in os.walk(directory):
+        for name in names:
+            if name.endswith(".part") or ".thumb." in name:
+                continue
+            path = os.path.join(dirpath, name)
+            yield path, os.path.relpath(path, root).replace(os.sep, "/")
+
+
+def pack(day, files, root):
+    """
+    Add files [(path, key)] to day's archive. The archive is rebuilt in a fresh temp file
+    beside the old one and renamed over it, so readers see either the old or the new
+    archive, never a partial one. Callers hold the retention lock, so no two passes rebuild
+    the same archive at once. Returns the number of crops added.
+    """
+    target = archive_path(day, root)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".part")
+    added = 0
+    try:
+        with os.fdopen(fd, "wb") as f, zipfile.ZipFile(f, "w", zipfile.ZIP_STORED) as out:
+            names = set()
+            if os.path.exists(target):
+                with zipfile.ZipFile(target) as old:
+                    for info in old.infolist():
+                        out.writestr(info, old.read(info))
+                        names.add(info.filename)
+            for path, key in files:
+                if key not in names:
+                    out.write(path, key)
+                    names.add(key)
+                    added += 1
+        os.replace(tmp, target)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return added
+
+
+class CropRetention:
+    """Background pass over the crop store every interval seconds; see the module docstring."""
+
+    def __init__(self, days=30, mode="pack", archive_days=0, interval=3600.0, root=None):
+        self.days = days
+        self.mode = mode
+        self.archive_days = archive_days
+        self.interval = interval
+        self.root = root
+        self.runs = 0
+        self.errors = 0
+        self.packed = 0
+        self.deleted = 0
+        self.archives_deleted = 0
+        self.skipped = 0
+        self.bytes_freed = 0
+        self.last_run_at = None
+        self.last_duration_ms = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="crop-retention", daemon=True)
+        self._thread.start()
+        logger.info("Crop retention started (%s after %s days)", self.mode, self.days)
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            self.run_once()
+            if self._stop.wait(self.interval):
+                return
+
+    def run_once(self, today=None):
+        t0 = time.perf_counter()
+        try:
+            self._sweep(today or datetime.utcnow().date())
+        except Exception as e:
+            self.errors += 1
+            logger.exception("Crop retention failed: %s", e)
+        self.runs += 1
+        self.last_run_at = datetime.utcnow()
+        self.last_duration_ms = (time.perf_counter() - t0) * 1000.0
+
+    def _sweep(self, today):
+        root = self.root or settings.STATIC_IMAGE_DIR
+        if self.days <= 0 or not os.path.isdir(root):
+            return
+        with _exclusive(os.path.join(root, ARCHIVE_DIR)) as held:
+            if not held:
+                self.skipped += 1
+                logger.info("Crop retention skipped: another process holds the lock")
+                return
+            self._sweep_locked(root, today)
+
+    def _sweep_locked(self, root, today):
+        cutoff = today - timedelta(days=self.days)
+        for day, path in _day_dirs(root):
+            if day < cutoff:
+                self._retire(day, list(_crop_files(path, root)), root)
+                shutil.rmtree(path, ignore_errors=True)
+                self._prune_empty(os.path.dirname(path), root)
+        # unsharded crops from before sharding, by modification day
+        legacy = {}
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if not os.path.isfile(path) or name.endswith(".part") or ".thumb." in name:
+                continue
+            day = datetime.utcfromtimestamp(os.path.getmtime(path)).date()
+            if day < cutoff:
+                legacy.setdefault(day, []).append((path, name))
+        for day, files in legacy.items():
+            self._retire(day, files, root)
+            if self.mode == "pack":
+                index_legacy(day, [key for _, key in files], root)
+            for path, _ in files:
+                os.remove(path)
+        if self.archive_days > 0:
+            self._expire_archives(root, today - timedelta(days=self.archive_days))
+
+    def _retire(self, day, files, root):
+        freed = sum(os.path.getsize(p) for p, _ in files)
+        if self.mode == "pack":
+            self.packed += pack(day, files, root)
+            logger.info("Packed %d crops of %s into %s", len(files), day, archive_path(day, root))
+        else:
+            self.deleted += len(files)
+            logger.info("Deleting %d crops of %s", len(files), day)
+        self.bytes_freed += freed
+
+    @staticmethod
+    def _prune_empty(directory, root):
+        # drop month/year directories left empty
+        while os.path.abspath(directory) != os.path.abspath(root):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return
+            directory = os.path.dirname(directory)
+
+    def _expire_archives(self, root, cutoff):
+        directory = os.path.join(root, ARCHIVE_DIR)
+        if not os.path.isdir(directory):
+            return
+        archives.close()  # let go of handles on files about to be removed
+        for name in os.listdir(directory):
+            try:
+                day = datetime.strptime(name, "%Y-%m-%d.zip").date()
+            except ValueError:
+                continue
+            if day < cutoff:
+                path = os.path.join(directory, name)
+                self.bytes_freed += os.path.getsize(path)
+                os.remove(path)
+                self.archives_deleted += 1
+
+    def stats(self):
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "mode": self.mode,
+            "days": self.days,
+            "runs": self.runs,
+            "errors": self.errors,
+            "skipped": self.skipped,
+            "packed": self.packed,
+            "deleted": self.deleted,
+            "archives_deleted": self.archives_deleted,
+            "bytes_freed": self.bytes_freed,
+            "last_run_at": self.last_run_at,
+            "last_duration_ms": round(self.last_duration_ms, 3),
+        }
+
+
+retention = CropRetention(settings.CROP_RETENTION_DAYS, settings.CROP_RETENTION_MODE,
+                          settings.CROP_ARCHIVE_RETENTION_DAYS, settings.CROP_RETENTION_INTERVAL_SECONDS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack or delete old crop images")
+    parser.add_argument("--days", type=int, default=settings.CROP_RETENTION_DAYS)
+    parser.add_argument("--mode", choices=("pack", "delete"), default=settings.CROP_RETENTION_MODE)
+    parser.add_argument("--archive-days", type=int, default=settings.CROP_ARCHIVE_RETENTION_DAYS)
+    args = parser.parse_args()
+    job = CropRetention(args.days, args.mode, args.archive_days)
+    job.run_once()
+    print(job.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Incrementally maintained analytics rollups.
+
+    cd backend && python -m detection.rollups --rebuild     # once, to backfill existing history
+
+traffic_hourly counts entries, exits and detections per UTC hour, camera and category;
+dwell_daily is a histogram of session dwell time (last_seen - entry_time) per exit day, entry
+camera and category, with DWELL_BUCKETS_SECONDS bounds. Both are bumped inside the
+transaction that writes what they count (session_manager: new sessions, the Detection
+insert, and the expiry sweeps closing sessions), so they never drift from the rows and the
+analytics endpoints read O(buckets) rows however much history there is.
+"""
+import argparse
+import bisect
+from collections import defaultdict
+from sqlalchemy import delete, select
+from models.analytics import TrafficHourly, DwellDaily
+from utils.config import settings
+
+traffic_table = TrafficHourly.__table__
+dwell_table = DwellDaily.__table__
+DWELL_BOUNDS = tuple(sorted(int(b) for b in settings.DWELL_BUCKETS_SECONDS.split(",") if b.strip()))
+UNKNOWN_CAMERA = "unknown"
+
+
+def hour_of(ts):
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def dwell_bucket(seconds):
+    """Upper bound of the bucket seconds falls in, -1 past the last bound."""
+    i = bisect.bisect_left(DWELL_BOUNDS, seconds)
+    return DWELL_BOUNDS[i] if i < len(DWELL_BOUNDS) else -1
+
+
+def _upsert_add(db, table, keys, counts, deltas):
+    """
+    Add deltas ({key tuple: {count column: delta}}) onto the rollup rows, creating missing
+    ones. One INSERT ... ON CONFLICT DO UPDATE executemany on sqlite and postgres; other
+    backends fall back to update-then-insert per row.
+    """
+    if not deltas:
+        return
+    rows = [dict(zip(keys, key), **{c: d.get(c, 0) for c in counts}) for key, d in deltas.items()]
+    dialect = db.bind.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=list(keys),
+                                          set_={c: table.c[c] + getattr(stmt.excluded, c) for c in counts})
+        db.execute(stmt, rows)
+        return
+    for row in rows:
+        match = [table.c[k] == row[k] for k in keys]
+        if db.execute(table.update().where(*match).values({c: table.c[c] + row[c] for c in counts})).rowcount == 0:
+            db.execute(table.insert(), row)
+
+
+_TRAFFIC_KEYS = ("hour", "camera_id", "category")
+_TRAFFIC_COUNTS = ("entries", "exits", "detections")
+_DWELL_KEYS = ("day", "camera_id", "category", "le_seconds")
+_DWELL_COUNTS = ("sessions", "total_seconds")
+
+
+def _traffic_deltas():
+    return defaultdict(lambda: dict.fromkeys(_TRAFFIC_COUNTS, 0))
+
+
+def record_entries(db, entries):
+    """entries: (entry_time, camera_id, category) of newly opened sessions."""
+    deltas = _traffic_deltas()
+    for ts, camera_id, category in entries:
+        deltas[(hour_of(ts), camera_id or UNKNOWN_CAMERA, category or "visitor")]["entries"] += 1
+    _upsert_add(db, traffic_table, _TRAFFIC_KEYS, _TRAFFIC_COUNTS, deltas)
+
+
+def record_detections(db, rows):
+    """rows: Detection row dicts (timestamp, camera_id, and the session's category)."""
+    deltas = _traffic_deltas()
+    for r in rows:
+        deltas[(hour_of(r["timestamp"]), r.get("camera_id") or UNKNOWN_CAMERA, r.get("category") or "visitor")]["detections"] += 1
+    _upsert_add(db, traffic_table, _TRAFFIC_KEYS, _TRAFFIC_COUNTS, deltas)
+
+
+def record_exits(db, sessions, exit_time=None):
+    """
+    sessions: closed session rows with entry_time, last_seen, category and entry_camera_id
+    (and exit_time, unless every one closed at exit_time).
+    """
+    traffic = _traffic_deltas()
+    dwell = defaultdict(lambda: dict.fromkeys(_DWELL_COUNTS, 0))
+    for s in sessions:
+        closed = exit_time or s.exit_time
+        camera_id, category = s.entry_camera_id or UNKNOWN_CAMERA, s.category or "visitor"
+        traffic[(hour_of(closed), camera_id, category)]["exits"] += 1
+        seconds = max(0.0, ((s.last_seen or s.entry_time) - s.entry_time).total_seconds()) if s.entry_time else 0.0
+        d = dwell[(closed.date(), camera_id, category, dwell_bucket(seconds))]
+        d["sessions"] += 1
+        d["total_seconds"] += seconds
+    _upsert_add(db, traffic_table, _TRAFFIC_KEYS, _TRAFFIC_COUNTS, traffic)
+    _upsert_add(db, dwell_table, _DWELL_KEYS, _DWELL_COUNTS, dwell)
+
+
+def _chunks(result, size):
+    batch = []
+    for row in result:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def rebuild(db, chunk=10000):
+    """
+    Recompute both rollups from access_sessions and detections, streaming chunk rows at a
+    time (the upserts add up, so chunks need no merging). Run with ingest stopped.
+    """
+    from models.sessions import AccessSession
+    from models.detections import Detection
+    db.execute(delete(traffic_table))
+    db.execute(delete(dwell_table))
+    counts = {"sessions": 0, "exited": 0, "detections": 0}
+    q = select(AccessSession.entry_time, AccessSession.last_seen, AccessSession.exit_time, AccessSession.status,
+               AccessSession.category, AccessSession.entry_camera_id)
+    for batch in _chunks(db.execute(q.execution_options(yield_per=chunk)), chunk):
+        record_entries(db, [(s.entry_time, s.entry_camera_id, s.category) for s in batch if s.entry_time])
+        exited = [s for s in batch if s.status == "exited" and s.exit_time]
+        record_exits(db, exited)
+        counts["sessions"] += len(batch)
+        counts["exited"] += len(exited)
+    q = select(Detection.timestamp, Detection.camera_id, AccessSession.category) \
+        .outerjoin(AccessSession, AccessSession.id == Detection.session_id) \
+        .where(Detection.timestamp.isnot(None))
+    for batch in _chunks(db.execute(q.execution_options(yield_per=chunk)), chunk):
+        record_detections(db, [{"timestamp": r.timestamp, "camera_id": r.camera_id, "category": r.category} for r in batch])
+        counts["detections"] += len(batch)
+    db.commit()
+    return counts
+
+
+def traffic(db, since, until, camera_id=None, category=None, bucket="hour"):
+    """[{time, entries, exits, detections}] per hour (or day) in [since, until), oldest first."""
+    q = select(TrafficHourly.hour, TrafficHourly.entries, TrafficHourly.exits, TrafficHourly.detections) \
+        .where(TrafficHourly.hour >= hour_of(since), TrafficHourly.hour < until)
+    if camera_id:
+        q = q.where(TrafficHourly.camera_id == camera_id)
+    if category:
+        q = q.where(TrafficHourly.category == category)
+    out = {}
+    for r in db.execute(q):
+        key = r.hour if bucket == "hour" else r.hour.replace(hour=0)
+        b = out.setdefault(key, {"time": key, "entries": 0, "exits": 0, "detections": 0})
+        b["entries"] += r.entries
+        b["exits"] += r.exits
+        b["detections"] += r.detections
+    return [out[k] for k in sorted(out)]
+
+
+def traffic_by_camera(db, since, until, category=None):
+    """Totals per camera over [since, until)."""
+    q = select(TrafficHourly.camera_id, TrafficHourly.entries, TrafficHourly.exits, TrafficHourly.detections) \
+        .where(TrafficHourly.hour >= hour_of(since), TrafficHourly.hour < until)
+    if category:
+        q = q.where(TrafficHourly.category == category)
+    out = {}
+    for r in db.execute(q):
+        b = out.setdefault(r.camera_id, {"camera_id": r.camera_id, "entries": 0, "exits": 0, "detections": 0})
+        b["entries"] += r.entries
+        b["exits"] += r.exits
+        b["detections"] += r.detections
+    return sorted(out.values(), key=lambda b: b["camera_id"])
+
+
+def dwell(db, since, until, camera_id=None, category=None):
+    """
+    Dwell histogram of sessions that exited on days in [since, until]: bucket counts, count,
+    mean, and p50/p90 estimated as the upper bound of the bucket holding that rank.
+    """
+    q = select(DwellDaily.le_seconds, DwellDaily.sessions, DwellDaily.total_seconds) \
+        .where(DwellDaily.day >= since, DwellDaily.day <= until)
+    if camera_id:
+        q = q.where(DwellDaily.camera_id == camera_id)
+    if category:
+        q = q.where(DwellDaily.category == category)
+    counts, total, n = defaultdict(int), 0.0, 0
+    for r in db.execute(q):
+        counts[r.le_seconds] += r.sessions
+        total += r.total_seconds
+        n += r.sessions
+    order = sorted(counts, key=lambda b: float("inf") if b < 0 else b)
+
+    def quantile(q):
+        if not n:
+            return None
+        seen = 0
+        for b in order:
+            seen += counts[b]
+            if seen >= q * n:
+                return None if b < 0 else b
+        return None
+
+    return {
+        "sessions": n,
+        "mean_seconds": round(total / n, 1) if n else None,
+        "p50_le_seconds": quantile(0.5),
+        "p90_le_seconds": quantile(0.9),
+        "buckets": [{"le_seconds": None if b < 0 else b, "sessions": counts[b]} for b in order],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analytics rollups")
+    parser.add_argument("--rebuild", action="store_true", help="recompute the rollups from sessions and detections")
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+        return
+    from models.base import SessionLocal, engine, upgrade_schema
+    upgrade_schema(engine)
+    db = SessionLocal()
+    try:
+        print(rebuild(db))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
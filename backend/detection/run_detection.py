@@ -1,10 +1,16 @@
+import atexit
 import cv2
 import time
 import requests
-from detection.detector import PlateDetector, save_crop_image
-from detection.ocr import ocr_image
+from detection.detector import PlateDetector
+from detection.image_store import encode_image, store_image_bytes
+from detection.ocr import ocr_batch, ocr_stats
+from detection.pipeline import Pipeline
+from detection.tracker import PlateTracker
+from detection.motion import MotionGate, detect_gated, parse_roi
 from utils.config import settings
 from utils.logger import get_logger
+from utils.metrics import registry, upload_seconds, MetricsPusher
 import numpy as np
 import os
 
@@ -12,49 +18,239 @@ logger = get_logger()
 API_BASE = os.getenv("API_BASE", "http://localhost:8000/api")
 VIDEO_PATH = os.getenv("VIDEO_PATH", "")
 CAMERA_INDEX = int(os.getenv("CAMERA_INDEX", "0"))
-SAVE_IMAGES = True
+CAMERA_ID = os.getenv("CAMERA_ID", "cam0")
+SAVE_IMAGES = os.getenv("SAVE_IMAGES", "0") == "1"  # keep a local copy of uploaded crops
 
-def main():
-    detector = PlateDetector()
-    cap = cv2.VideoCapture(CAMERA_INDEX)
-    if not cap.isOpened():
-        logger.error("Camera not available")
-        return
-    last_send = 0
+# pipelined mode: capture, detect, OCR and upload run on separate threads joined by bounded queues
+PIPELINE = os.getenv("PIPELINE", "0") == "1"
+FRAME_QUEUE_SIZE = int(os.getenv("FRAME_QUEUE_SIZE", "2"))
+FRAME_MAX_AGE = float(os.getenv("FRAME_MAX_AGE", "0.5"))
+CROP_QUEUE_SIZE = int(os.getenv("CROP_QUEUE_SIZE", "16"))
+UPLOAD_QUEUE_SIZE = int(os.getenv("UPLOAD_QUEUE_SIZE", "32"))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "1"))
+OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", "8"))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+PIPELINE_REPORT_INTERVAL = float(os.getenv("PIPELINE_REPORT_INTERVAL", "10"))
+
+# temporal tracking: OCR each plate track a few times and upload one fused event per track
+TRACKING = os.getenv("TRACKING", "1") == "1"
+TRACK_MAX_OCR = int(os.getenv("TRACK_MAX_OCR", "3"))
+TRACK_OCR_INTERVAL = int(os.getenv("TRACK_OCR_INTERVAL", "3"))
+TRACK_MAX_AGE = float(os.getenv("TRACK_MAX_AGE", "1.5"))
+TRACK_REFRESH_SECONDS = float(os.getenv("TRACK_REFRESH_SECONDS", "60"))
+
+# motion/ROI gating: skip the detector on frames where nothing moved inside the lane/barrier region
+MOTION_GATING = os.getenv("MOTION_GATING", "1") == "1"
+CAMERA_ROI = os.getenv("CAMERA_ROI", "")  # "x1,y1,x2,y2" as fractions of the frame
+MOTION_THRESHOLD = int(os.getenv("MOTION_THRESHOLD", "25"))
+MOTION_MIN_AREA = float(os.getenv("MOTION_MIN_AREA", "0.01"))
+MOTION_SCALE_WIDTH = int(os.getenv("MOTION_SCALE_WIDTH", "160"))
+
+
+def make_gate(roi=None):
+    if not MOTION_GATING:
+        return None
+    return MotionGate(parse_roi(roi if roi is not None else CAMERA_ROI), scale_width=MOTION_SCALE_WIDTH,
+                      threshold=MOTION_THRESHOLD, min_area=MOTION_MIN_AREA)
+
+
+def make_tracker():
+    return PlateTracker(max_age=TRACK_MAX_AGE, max_ocr=TRACK_MAX_OCR, ocr_interval=TRACK_OCR_INTERVAL, refresh_interval=TRACK_REFRESH_SECONDS)
+
+
+def open_capture(source):
+    """
+    source: device index (int or digit string), RTSP/HTTP URL, or video file path.
+    returns (capture, live); live is False for files, which end instead of being retried.
+    """
+    if isinstance(source, int) or str(source).isdigit():
+        return cv2.VideoCapture(int(source)), True
+    live = "://" in str(source)
+    return cv2.VideoCapture(source), live
+
+
+def upload_crop(http, crop, plate_text, confidence, camera_id="cam0"):
+    """Encode the crop once and post it to the backend as multipart (optionally keeping a local copy)."""
+    try:
+        payload = encode_image(crop)
+    except ValueError:
+        logger.error("Could not encode crop for %s", plate_text)
+        return None
+    if SAVE_IMAGES:
+        store_image_bytes(payload, settings.STATIC_IMAGE_DIR, camera_id=camera_id)
+    files = {"file": (f"{plate_text}.jpg", payload, "image/jpeg")}
+    data = {"ocr_text": plate_text, "confidence": str(confidence), "camera_id": camera_id}
+    t0 = time.perf_counter()
+    try:
+        r = http.post(f"{API_BASE}/detections/upload", files=files, data=data, timeout=5)
+        upload_seconds.observe(time.perf_counter() - t0, str(r.status_code))
+        logger.debug("Upload response: %s", r.json())
+        return r
+    except Exception as e:
+        upload_seconds.observe(time.perf_counter() - t0, "error")
+        logger.error("Upload failed: %s", e)
+        return None
+
+
+def run_serial(cap, detector, camera_id="cam0", live=True, gate=None):
+    http = requests.Session()
+    tracker = make_tracker() if TRACKING else None
+    next_report = time.monotonic() + PIPELINE_REPORT_INTERVAL
     try:
         while True:
             ret, frame = cap.read()
             if not ret:
+                if not live:
+                    break
                 time.sleep(0.1)
                 continue
-            dets = detector.detect_in_frame(frame)
-            for d in dets:
-                crop = d["crop"]
-                ocr = ocr_image(crop)
-                plate_text = ocr["text"]
-                confidence = ocr["confidence"] * d.get("confidence", 0.6)
-                # basic threshold to reduce noise
-                if not plate_text or len(plate_text) < 3:
-                    continue
-                # save crop locally & call backend upload
-                if SAVE_IMAGES:
-                    path = save_crop_image(crop, plate_text, settings.STATIC_IMAGE_DIR)
-                # upload via multipart
-                files = {"file": open(path, "rb")}
-                data = {"ocr_text": plate_text, "confidence": str(confidence), "camera_id":"cam0"}
-                try:
-                    r = requests.post(f"{API_BASE}/detections/upload", files=files, data=data, timeout=5)
-                    logger.info("Upload response: %s", r.json())
-                except Exception as e:
-                    logger.error("Upload failed: %s", e)
+            dets = [d for d in detect_gated(detector, gate, frame) if d["crop"].size]
+            if time.monotonic() >= next_report:
+                if gate is not None:
+                    logger.info("motion camera=%s %s", camera_id, gate.stats())
+                logger.info("ocr camera=%s %s", camera_id, ocr_stats())
+                next_report = time.monotonic() + PIPELINE_REPORT_INTERVAL
+            if tracker is not None:
+                wanted, events = tracker.update(dets)
+                results = ocr_batch([d["crop"] for _, d in wanted])
+                for (track_id, d), ocr in zip(wanted, results):
+                    ev = tracker.add_reading(track_id, ocr["text"], ocr["confidence"] * d.get("confidence", 0.6), d["crop"])
+                    if ev:
+                        events.append(ev)
+                for ev in events:
+                    upload_crop(http, ev["crop"], ev["plate"], ev["confidence"], camera_id)
+            else:
+                results = ocr_batch([d["crop"] for d in dets])
+                for d, ocr in zip(dets, results):
+                    crop = d["crop"]
+                    plate_text = ocr["text"]
+                    confidence = ocr["confidence"] * d.get("confidence", 0.6)
+                    # basic threshold to reduce noise
+                    if not plate_text or len(plate_text) < 3:
+                        continue
+                    upload_crop(http, crop, plate_text, confidence, camera_id)
+            if live:
+                time.sleep(0.1)
+    finally:
+        if tracker is not None:
+            for ev in tracker.flush():
+                upload_crop(http, ev["crop"], ev["plate"], ev["confidence"], camera_id)
+
+
+def build_pipeline(cap, detector, camera_id="cam0", live=True, gate=None):
+    """
+    capture -> frames -> detect -> crops -> ocr -> uploads -> upload
+    On a live camera frames older than FRAME_MAX_AGE are dropped so detection always works on
+    a recent frame. A file is read faster than real time and has no "recent" frame, so there
+    every queue is lossless and capture simply waits for the slowest stage.
+    With tracking the uploads queue is lossless: each track yields a single fused event, so a
+    slow upload holds detect back (and frames age out) rather than evicting one.
+    """
+    tracker = make_tracker() if TRACKING else None
+    pipe = Pipeline(report_interval=PIPELINE_REPORT_INTERVAL)
+    frames = pipe.queue("frames", FRAME_QUEUE_SIZE, max_age=FRAME_MAX_AGE if live else None,
+                        lossless=not live)
+    crops = pipe.queue("crops", CROP_QUEUE_SIZE, lossless=not live)
+    uploads = pipe.queue("uploads", UPLOAD_QUEUE_SIZE, lossless=tracker is not None or not live)
+
+    def capture():
+        ret, frame = cap.read()
+        if not ret:
+            if not live:
+                pipe.finish()  # end of file: drain the queues and stop
             time.sleep(0.1)
+            return None
+        return [frame]
+
+    def detect(frame):
+        dets = [d for d in detect_gated(detector, gate, frame) if d["crop"].size]
+        if tracker is None:
+            return dets
+        wanted, events = tracker.update(dets)
+        # finished tracks skip OCR and go straight to upload
+        for ev in events:
+            uploads.put(ev)
+        return [dict(d, track_id=track_id) for track_id, d in wanted]
+
+    def ocr(dets):
+        # crops from several frames are recognised together in one batch
+        out = []
+        for d, res in zip(dets, ocr_batch([d["crop"] for d in dets])):
+            plate_text = res["text"]
+            confidence = res["confidence"] * d.get("confidence", 0.6)
+            if tracker is not None:
+                ev = tracker.add_reading(d["track_id"], plate_text, confidence, d["crop"])
+                if ev:
+                    out.append(ev)
+                continue
+            if not plate_text or len(plate_text) < 3:
+                continue
+            out.append({"crop": d["crop"], "plate": plate_text, "confidence": confidence})
+        return out
+
+    http = requests.Session()
+
+    def upload(item):
+        upload_crop(http, item["crop"], item["plate"], item["confidence"], camera_id)
+        return None
+
+    pipe.stage("capture", capture, outbox=frames)
+    pipe.stage("detect", detect, inbox=frames, outbox=crops)
+    pipe.stage("ocr", ocr, inbox=crops, outbox=uploads, workers=OCR_WORKERS, batch_size=OCR_BATCH_SIZE)
+    pipe.stage("upload", upload, inbox=uploads, workers=UPLOAD_WORKERS)
+    pipe.tracker = tracker
+    pipe.uploads = uploads
+    pipe.add_reporter("ocr", ocr_stats)
+    if gate is not None:
+        pipe.add_reporter("motion", gate.stats)
+    return pipe
+
+
+def run_camera(camera_id, source, detector=None, roi=None):
+    """
+    Capture/inference loop for one camera; every uploaded event is tagged with camera_id.
+    roi: per-camera region of interest (see motion.parse_roi), defaults to CAMERA_ROI.
+    """
+    if detector is None:
+        detector = PlateDetector()
+        detector.warm_up()
+    gate = make_gate(roi)
+    cap, live = open_capture(source)
+    if not cap.isOpened():
+        logger.error("Camera %s not available (%s)", camera_id, source)
+        return False
+    try:
+        if PIPELINE:
+            pipe = build_pipeline(cap, detector, camera_id, live, gate)
+            try:
+                pipe.run_forever()
+            finally:
+                if pipe.tracker is not None:
+                    # track events still queued at shutdown, then the tracks still open
+                    http = requests.Session()
+                    for ev in pipe.uploads.drain() + pipe.tracker.flush():
+                        upload_crop(http, ev["crop"], ev["plate"], ev["confidence"], camera_id)
+        else:
+            run_serial(cap, detector, camera_id, live, gate)
     finally:
         cap.release()
+    return True
+
+
+def start_metrics_push(instance):
+    """Push this process's metrics to the METRICS_PUSH_URL Pushgateway until exit; None when it is unset."""
+    if not settings.METRICS_PUSH_URL:
+        return None
+    registry.add_collector("ocr", ocr_stats)
+    pusher = MetricsPusher(settings.METRICS_PUSH_URL, settings.METRICS_JOB, instance, settings.METRICS_PUSH_INTERVAL_SECONDS)
+    pusher.start()
+    atexit.register(pusher.stop)
+    return pusher
+
+
+def main():
+    start_metrics_push(CAMERA_ID)
+    run_camera(CAMERA_ID, VIDEO_PATH or CAMERA_INDEX)
 
 if __name__ == "__main__":
     main()
-
-if VIDEO_PATH:
-    cap = cv2.VideoCapture(VIDEO_PATH)
-else:
-    cap = cv2.VideoCapture(CAMERA_INDEX)
\ No newline at end of file
@@ -0,0 +1,99 @@
+import threading
+import time
+from datetime import datetime
+from utils.config import settings
+from utils.logger import get_logger
+from utils.metrics import sweep_seconds
+from detection.session_manager import index, sweep_sessions, sweep_stale_sessions, refresh_residents
+
+logger = get_logger()
+
+
+class ExpiryScheduler:
+    """
+    Background thread that closes expired sessions off the request path.
+    It wakes at the index's next expiry deadline (or every interval seconds, whichever is
+    sooner) and runs sweep_sessions(); every full_interval seconds it also runs the global
+    sweep_stale_sessions() catch-up and picks up residents added by other workers. The sweeps are conditional UPDATEs, so several uvicorn
+    workers each running a scheduler close every session exactly once.
+    """
+
+    def __init__(self, interval=5.0, full_interval=60.0):
+        self.interval = interval
+        self.full_interval = full_interval
+        # expiry waits this long past the timeout for refreshes other workers have not flushed yet
+        self.grace = 2 * max(interval, settings.SESSION_FLUSH_INTERVAL_SECONDS)
+        self.runs = 0
+        self.full_runs = 0
+        self.expired = 0
+        self.errors = 0
+        self.last_run_at = None
+        self.last_duration_ms = 0.0
+        self.max_duration_ms = 0.0
+        self.total_duration_ms = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_full = 0.0
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="session-expiry", daemon=True)
+        self._thread.start()
+        logger.info("Session expiry scheduler started (interval=%ss)", self.interval)
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _delay(self):
+        deadline = index.next_deadline()
+        if deadline is None:
+            return self.interval
+        return min(self.interval, max(0.05, deadline + self.grace - datetime.utcnow().timestamp()))
+
+    def _run(self):
+        while not self._stop.wait(self._delay()):
+            self.run_once()
+
+    def run_once(self):
+        t0 = time.perf_counter()
+        kind = "incremental"
+        try:
+            closed = sweep_sessions(grace_seconds=self.grace)
+            if time.monotonic() - self._last_full >= self.full_interval:
+                kind = "full"
+                closed += sweep_stale_sessions(grace_seconds=self.grace)
+                refresh_residents()
+                self._last_full = time.monotonic()
+                self.full_runs += 1
+            self.expired += closed
+        except Exception as e:
+            self.errors += 1
+            logger.exception("Session sweep failed: %s", e)
+        elapsed = (time.perf_counter() - t0) * 1000.0
+        sweep_seconds.observe(elapsed / 1000.0, kind)
+        self.runs += 1
+        self.last_run_at = datetime.utcnow()
+        self.last_duration_ms = elapsed
+        self.total_duration_ms += elapsed
+        self.max_duration_ms = max(self.max_duration_ms, elapsed)
+
+    def stats(self):
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "runs": self.runs,
+            "full_runs": self.full_runs,
+            "expired": self.expired,
+            "errors": self.errors,
+            "active_sessions": len(index),
+            "last_run_at": self.last_run_at,
+            "last_duration_ms": round(self.last_duration_ms, 3),
+            "avg_duration_ms": round(self.total_duration_ms / self.runs, 3) if self.runs else 0.0,
+            "max_duration_ms": round(self.max_duration_ms, 3),
+        }
+
+
+sweeper = ExpiryScheduler(settings.SESSION_SWEEP_INTERVAL_SECONDS, settings.SESSION_FULL_SWEEP_INTERVAL_SECONDS)
@@ -0,0 +1,118 @@
+import heapq
+import threading
+import time
+from utils.logger import get_logger
+
+logger = get_logger()
+
+
+class _Entry:
+    __slots__ = ("session_id", "last_seen", "owner_id")
+
+    def __init__(self, session_id, last_seen, owner_id=None):
+        self.session_id = session_id
+        self.last_seen = last_seen
+        self.owner_id = owner_id
+
+
+class ActiveSessionIndex:
+    """
+    In-process view of active AccessSession rows keyed by plate.
+    Expiry deadlines live in a min-heap with lazy re-scheduling: a session is pushed once,
+    and when its deadline comes up with a newer last_seen it is pushed again instead of being
+    expired. Refreshing a session is therefore O(1) and a sweep only pops sessions whose
+    deadline actually passed. last_seen refreshes are kept in a dirty map and written back
+    in batches by the caller (see session_manager.flush_last_seen).
+    """
+
+    def __init__(self, timeout_seconds):
+        self.timeout = timeout_seconds
+        self.loaded = False
+        self._entries = {}
+        self._heap = []
+        self._dirty = {}
+        self._lock = threading.Lock()
+        self.last_flush = time.monotonic()
+
+    def load(self, rows):
+        """rows: iterable of (session_id, plate, last_seen, owner_id) for active sessions."""
+        with self._lock:
+            for session_id, plate, last_seen, owner_id in rows:
+                self._add(plate, session_id, last_seen, owner_id)
+            self.loaded = True
+
+    def _add(self, plate, session_id, last_seen, owner_id=None):
+        e = self._entries.get(plate)
+        if e is not None and e.session_id != session_id:
+            # two active sessions for one plate: keep the tracked one rather than orphaning it
+            # unseen until the full sweep; the other is left for that sweep to close
+            logger.warning("Plate %s already tracks session %s, not replacing it with %s", plate, e.session_id, session_id)
+            return False
+        self._entries[plate] = _Entry(session_id, last_seen, owner_id)
+        heapq.heappush(self._heap, (last_seen.timestamp() + self.timeout, plate, session_id))
+        return True
+
+    def add(self, plate, session_id, last_seen, owner_id=None):
+        """Track plate's active session; False (and logged) if the plate already tracks a different one."""
+        with self._lock:
+            return self._add(plate, session_id, last_seen, owner_id)
+
+    def get(self, plate):
+        with self._lock:
+            return self._entries.get(plate)
+
+    def touch(self, plate, now):
+        """Refresh last_seen in memory and queue it for the next batched write."""
+        with self._lock:
+            e = self._entries.get(plate)
+            if e is None:
+                return None
+            e.last_seen = now
+            self._dirty[e.session_id] = now
+            return e
+
+    def set_owner(self, plate, owner_id):
+        with self._lock:
+            e = self._entries.get(plate)
+            if e is not None:
+                e.owner_id = owner_id
+
+    def discard(self, plate, session_id=None):
+        with self._lock:
+            e = self._entries.get(plate)
+            if e is not None and (session_id is None or e.session_id == session_id):
+                del self._entries[plate]
+                self._dirty.pop(e.session_id, None)
+
+    def take_dirty(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            self.last_flush = time.monotonic()
+            return dirty
+
+    def pop_expired(self, now):
+        """Remove and return [(plate, session_id, last_seen)] whose last_seen + timeout <= now."""
+        expired = []
+        cutoff = now.timestamp()
+        with self._lock:
+            while self._heap and self._heap[0][0] <= cutoff:
+                _, plate, session_id = heapq.heappop(self._heap)
+                e = self._entries.get(plate)
+                if e is None or e.session_id != session_id:
+                    continue  # stale heap entry for a session already closed or replaced
+                deadline = e.last_seen.timestamp() + self.timeout
+                if deadline > cutoff:
+                    heapq.heappush(self._heap, (deadline, plate, session_id))
+                    continue
+                del self._entries[plate]
+                self._dirty.pop(session_id, None)
+                expired.append((plate, session_id, e.last_seen))
+        return expired
+
+    def next_deadline(self):
+        """Earliest pending deadline as a unix timestamp (may be stale-early), or None."""
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,80 +1,428 @@
+import contextlib
+import threading
+import time
+from sqlalchemy import bindparam, func
 from models.sessions import AccessSession
 from models.detections import Detection
 from models.owner_cache import OwnerCache
+from models.residents import Resident
 from models.base import SessionLocal
 from utils.config import settings
-from detection.excise_lookup import lookup_plate
-from detection.detector import save_crop_image
+from detection.excise_lookup import lookup_plate, cached_owner
+from detection.session_index import ActiveSessionIndex
+from detection.resident_index import ResidentIndex
+from detection.owner_resolver import OwnerResolver
+from detection.events import publish
+from detection.write_behind import WriteBehindBuffer
+from detection.rollups import record_entries, record_detections, record_exits
 from datetime import datetime, timedelta
 from utils.logger import get_logger
+from utils.metrics import db_commit_seconds, detection_seconds, detections_total
 
 logger = get_logger()
 
 ACTIVE_TIMEOUT = settings.ACTIVE_SESSION_TIMEOUT_SECONDS
+FLUSH_INTERVAL = settings.SESSION_FLUSH_INTERVAL_SECONDS
+WRITE_BEHIND = settings.DETECTION_WRITE_BEHIND
 
-def process_detection(plate_text, crop_image, confidence, camera_id="cam0"):
+index = ActiveSessionIndex(ACTIVE_TIMEOUT)
+residents = ResidentIndex(settings.RESIDENT_MATCH_MAX_DISTANCE)
+_load_lock = threading.Lock()
+# striped per-plate locks: "index miss, SELECT, INSERT new session, index.add" runs for one
+# plate at a time, so ingest threads seeing the same new plate never open two sessions
+_plate_locks = [threading.Lock() for _ in range(64)]
+
+
+def _normalize(plate_text):
+    # basic text normalization in case upper/lower
+    return (plate_text or "").upper().strip()
+
+
+@contextlib.contextmanager
+def _locked_plates(plates):
+    stripes = sorted({hash(p) % len(_plate_locks) for p in plates})  # fixed order: no deadlock between batches
+    for i in stripes:
+        _plate_locks[i].acquire()
+    try:
+        yield
+    finally:
+        for i in reversed(stripes):
+            _plate_locks[i].release()
+
+
+sessions_table = AccessSession.__table__
+detections_table = Detection.__table__
+_DETECTION_COLUMNS = frozenset(detections_table.c.keys())
+
+
+def _ensure_index(db):
+    if index.loaded:
+        return
+    with _load_lock:
+        if index.loaded:
+            return
+        rows = db.query(AccessSession.id, AccessSession.plate_number, AccessSession.last_seen, AccessSession.owner_id) \
+            .filter(AccessSession.status == "active").all()
+        index.load(rows)
+        logger.info("Loaded %d active sessions into index", len(rows))
+
+
+def _ensure_residents(db):
+    if residents.loaded:
+        return
+    with _load_lock:
+        if residents.loaded:
+            return
+        residents.load(db.query(Resident.id, Resident.plate_number).all())
+        logger.info("Loaded %d resident plates into index", len(residents))
+
+
+def refresh_residents():
+    """
+    Pick up residents added through other workers (or removed): new ids are added
+    incrementally, a shrinking table triggers a full reload.
     """
-    - Check for an active session with same plate (not exited)
+    db = SessionLocal()
+    try:
+        if not residents.loaded:
+            _ensure_residents(db)
+            return 0
+        count, max_id = db.query(func.count(Resident.id), func.max(Resident.id)).one()
+        if count < len(residents):
+            residents.load(db.query(Resident.id, Resident.plate_number).all())
+            return count
+        rows = db.query(Resident.id, Resident.plate_number).filter(Resident.id > residents.max_id).all() if (max_id or 0) > residents.max_id else []
+        for resident_id, plate in rows:
+            residents.add(resident_id, plate)
+        return len(rows)
+    finally:
+        db.close()
+
+
+def process_detection(plate_text, crop_image, confidence, camera_id="cam0", image_path=None):
+    """
+    - Check for an active session with same plate (not exited), in-memory first
     - If none, create AccessSession (entry_time)
     - Add Detection record
-    - Lookup owner (cache)
+    - Attach a cached owner, or schedule the owner lookup in the background
+    - Tag the session resident or visitor against the in-memory resident index; resident_id and
+      resident_match report the closest registered plate even when a fuzzy hit stays a visitor
     - Return session info
+    Session changes commit before returning; the Detection row is written behind in batches
+    (DETECTION_WRITE_BEHIND), or in the same commit when that is off. last_seen refreshes are batched.
+    Pass image_path when the crop is already stored (e.g. the uploaded file) to skip re-encoding it.
     """
-    db = SessionLocal()
-    try:
-        # basic text normalization in case upper/lower
-        plate = (plate_text or "").upper().strip()
-        now = datetime.utcnow()
+    return process_detections([{"plate_text": plate_text, "crop_image": crop_image, "confidence": confidence,
+                                "camera_id": camera_id, "image_path": image_path}])[0]
 
-        # find active non-exited session
-        session = db.query(AccessSession).filter(AccessSession.plate_number == plate, AccessSession.status == "active").first()
-        if session:
-            session.last_seen = now
-            db.add(session)
-            db.commit()
+
+def _apply(db, item, now):
+    """Session side of one detection inside the caller's transaction; returns its context."""
+    plate = _normalize(item.get("plate_text"))
+    camera_id = item.get("camera_id") or "cam0"
+    image_path = item.get("image_path")
+
+    # save image unless the caller already stored it
+    if image_path is None:
+        from detection.detector import save_crop_image  # loads OpenCV; uploads arrive already stored
+        image_path = save_crop_image(item.get("crop_image"), plate, settings.STATIC_IMAGE_DIR, camera_id=camera_id)
+
+    new_session = None
+    entry = index.touch(plate, now)
+    if entry is None:
+        # not in this process' index; another worker (or an earlier item of this batch) may have opened it
+        row = db.query(AccessSession.id, AccessSession.owner_id) \
+            .filter(AccessSession.plate_number == plate, AccessSession.status == "active").first()
+        if row:
+            index.add(plate, row.id, now, row.owner_id)
+            entry = index.touch(plate, now)
         else:
-            session = AccessSession(plate_number=plate, entry_time=now, last_seen=now, status="active")
-            db.add(session)
-            db.commit()
-            db.refresh(session)
+            new_session = AccessSession(plate_number=plate, entry_time=now, last_seen=now, status="active", entry_camera_id=camera_id)
 
-        # save image
-        image_path = save_crop_image(crop_image, plate, settings.STATIC_IMAGE_DIR, camera_id=camera_id)
+    resident = residents.match(plate)
+    # an edit-distance hit is reported (resident_match="fuzzy") but only an exact or normalized
+    # match makes the session a resident one, unless RESIDENT_FUZZY_IS_RESIDENT opts in
+    is_resident = resident is not None and (resident[1] != "fuzzy" or settings.RESIDENT_FUZZY_IS_RESIDENT)
+    resident_id = resident[0] if is_resident else None
+    category = "resident" if is_resident else "visitor"
+    if new_session is not None:
+        new_session.category = category
+        new_session.resident_id = resident_id
 
-        # owner lookup (cache)
-        owner_data = lookup_plate(plate)
-        # find owner cache id
-        owner = db.query(OwnerCache).filter(OwnerCache.plate_number == plate).first()
+    owner_id = entry.owner_id if entry else None
+    owner_data = None
+    if owner_id is None:
+        owner = cached_owner(plate)
+        if owner is None:
+            row = db.query(OwnerCache.id, OwnerCache.owner_name, OwnerCache.vehicle_model, OwnerCache.registration_date) \
+                .filter(OwnerCache.plate_number == plate).first()
+            if row:
+                owner = (row.id, {"owner_name": row.owner_name, "vehicle_model": row.vehicle_model, "registration_date": row.registration_date})
         if owner:
-            session.owner_id = owner.id
-            db.add(session)
+            owner_id, owner_data = owner
+            if new_session is not None:
+                new_session.owner_id = owner_id
+            else:
+                db.query(AccessSession).filter(AccessSession.id == entry.session_id).update({"owner_id": owner_id, "last_seen": AccessSession.last_seen}, synchronize_session=False)
+
+    if new_session is not None:
+        db.add(new_session)
+        db.flush()
+    return {
+        "plate": plate, "camera_id": camera_id, "image_path": image_path, "confidence": float(item.get("confidence") or 0.0),
+        "session_id": entry.session_id if entry else new_session.id, "new_session": new_session is not None,
+        "owner_id": owner_id, "owner_data": owner_data, "resident": resident, "category": category,
+    }
+
+
+def insert_detections(db, rows):
+    """
+    Bulk INSERT of Detection rows (dicts of column values) in the caller's transaction, as one
+    executemany / multi-row VALUES statement instead of one ORM flush per row.
+    Returns the new ids in row order where the backend supports RETURNING, else Nones.
+    """
+    if not rows:
+        return []
+    # rows may carry extras for the rollups and events (the session category)
+    rows = [{k: v for k, v in r.items() if k in _DETECTION_COLUMNS} for r in rows]
+    stmt = detections_table.insert()
+    if getattr(db.bind.dialect, "insert_executemany_returning_sort_by_parameter_order", False):
+        result = db.execute(stmt.returning(detections_table.c.id, sort_by_parameter_order=True), rows)
+        return [r.id for r in result]
+    if len(rows) == 1:
+        return [db.execute(stmt, rows[0]).inserted_primary_key[0]]
+    db.execute(stmt, rows)
+    return [None] * len(rows)
+
+
+def process_detections(items):
+    """
+    Batch form of process_detection: items are dicts with its arguments. The session changes of
+    the whole batch commit in one transaction. The Detection rows go to detection_writer, which
+    bulk-inserts them in the background and then publishes their "detection" events; with
+    DETECTION_WRITE_BEHIND=0 they are bulk-inserted in the same transaction instead.
+    """
+    start = time.perf_counter()
+    with _locked_plates({_normalize(item.get("plate_text")) for item in items}):
+        db = SessionLocal()
+        try:
+            _ensure_index(db)
+            _ensure_residents(db)
+            now = datetime.utcnow()
+            ctxs = [_apply(db, item, now) for item in items]
+            rows = [{
+                "session_id": c["session_id"], "timestamp": now, "ocr_text": c["plate"], "detection_confidence": c["confidence"],
+                "image_path": c["image_path"], "camera_id": c["camera_id"], "category": c["category"],
+            } for c in ctxs]
+            record_entries(db, [(now, c["camera_id"], c["category"]) for c in ctxs if c["new_session"]])
+            if WRITE_BEHIND:
+                # only session changes commit here; the Detection rows go out with the next batch
+                with db_commit_seconds.time("sessions"):
+                    db.commit()
+                detection_writer.submit(rows)
+                ids = [None] * len(rows)
+            else:
+                ids = insert_detections(db, rows)
+                record_detections(db, rows)
+                # sessions and detections together: timed apart from either write-behind commit
+                with db_commit_seconds.time("sessions_detections"):
+                    db.commit()
+        finally:
+            db.close()
+        # still under the plate locks, so the plate's next detection finds the new session
+        for c in ctxs:
+            if c["new_session"]:
+                index.add(c["plate"], c["session_id"], now, c["owner_id"])
+
+    results = []
+    for c, row, detection_id in zip(ctxs, rows, ids):
+        plate, session_id, owner_id, resident = c["plate"], c["session_id"], c["owner_id"], c["resident"]
+        if not c["new_session"] and owner_id is not None:
+            index.set_owner(plate, owner_id)
+        if owner_id is None:
+            owner_resolver.submit(plate)
+
+        session_event = {"session_id": session_id, "plate": plate, "last_seen": now, "owner_id": owner_id,
+                         "category": c["category"], "resident_id": resident[0] if resident else None,
+                         "resident_match": resident[1] if resident else None}
+        if c["new_session"]:
+            publish("session_opened", dict(session_event, entry_time=now, camera_id=c["camera_id"]))
+        else:
+            publish("session_updated", session_event)
+        if not WRITE_BEHIND:
+            _publish_detection(detection_id, row)
+
+        detections_total.inc(c["category"])
+        logger.debug("Processed detection %s, session=%s", plate, session_id)
+        results.append({
+            "session_id": session_id,
+            "plate": plate,
+            "owner": c["owner_data"],
+            "owner_pending": owner_id is None,
+            "category": c["category"],
+            "resident_id": session_event["resident_id"],
+            "resident_match": session_event["resident_match"],
+        })
+
+    if not WRITE_BEHIND and time.monotonic() - index.last_flush >= FLUSH_INTERVAL:
+        flush_last_seen()
+    detection_seconds.observe(time.perf_counter() - start)
+    return results
+
+
+def _publish_detection(detection_id, row):
+    publish("detection", {"id": detection_id, "session_id": row["session_id"], "plate": row["ocr_text"],
+                          "confidence": row["detection_confidence"], "camera_id": row["camera_id"],
+                          "image_path": row["image_path"], "timestamp": row["timestamp"]})
+
+
+def _write_detections(rows):
+    db = SessionLocal()
+    try:
+        ids = insert_detections(db, rows)
+        record_detections(db, rows)
+        with db_commit_seconds.time("detections"):
             db.commit()
+    finally:
+        db.close()
+    for detection_id, row in zip(ids, rows):
+        _publish_detection(detection_id, row)
+
+
+def _flush_last_seen_if_due():
+    if time.monotonic() - index.last_flush >= FLUSH_INTERVAL:
+        flush_last_seen()
+
 
-        # create Detection record
-        det = Detection(session_id=session.id, ocr_text=plate, detection_confidence=float(confidence), image_path=image_path, camera_id=camera_id)
-        db.add(det)
+# Detection rows (and the coalesced last_seen refreshes) are written off the request path;
+# see write_behind.py for the flush and loss semantics
+detection_writer = WriteBehindBuffer("detections", _write_detections, batch_size=settings.DETECTION_FLUSH_ROWS,
+                                     interval=settings.DETECTION_FLUSH_INTERVAL_MS / 1000.0,
+                                     max_pending=settings.DETECTION_MAX_PENDING, on_tick=_flush_last_seen_if_due)
+
+
+def resolve_owner(plate):
+    """Look the owner up (cache or excise site) and link it to the plate's active sessions."""
+    lookup_plate(plate)
+    owner = cached_owner(plate)
+    db = SessionLocal()
+    try:
+        if owner is None:
+            row = db.query(OwnerCache.id).filter(OwnerCache.plate_number == plate).first()
+            if row is None:
+                return None
+            owner = (row.id, None)
+        owner_id = owner[0]
+        linked = db.query(AccessSession) \
+            .filter(AccessSession.plate_number == plate, AccessSession.status == "active", AccessSession.owner_id.is_(None)) \
+            .update({"owner_id": owner_id, "last_seen": AccessSession.last_seen}, synchronize_session=False)
         db.commit()
+        index.set_owner(plate, owner_id)
+        if linked:
+            entry = index.get(plate)
+            publish("session_updated", {"session_id": entry.session_id if entry else None, "plate": plate, "owner_id": owner_id})
+        return owner_id
+    finally:
+        db.close()
 
-        logger.info("Processed detection %s, session=%s", plate, session.id)
-        return {
-            "session_id": session.id,
-            "plate": plate,
-            "owner": owner_data
-        }
+
+# owner lookups can block on the excise site for seconds, so they run on a background job queue
+owner_resolver = OwnerResolver(resolve_owner, workers=settings.OWNER_LOOKUP_WORKERS, maxsize=settings.OWNER_LOOKUP_QUEUE_SIZE)
+
+
+def flush_last_seen():
+    """Write coalesced last_seen refreshes back in one executemany UPDATE."""
+    dirty = index.take_dirty()
+    if not dirty:
+        return 0
+    db = SessionLocal()
+    try:
+        stmt = sessions_table.update() \
+            .where(sessions_table.c.id == bindparam("sid"), sessions_table.c.status == "active") \
+            .values(last_seen=bindparam("ts"))
+        result = db.execute(stmt, [{"sid": sid, "ts": ts} for sid, ts in dirty.items()])
+        with db_commit_seconds.time("last_seen"):
+            db.commit()
+        if not (db.bind.dialect.supports_sane_multi_rowcount and result.rowcount == len(dirty)):
+            # some sessions were closed under us (another worker's sweep, or ours racing a
+            # re-adopt): drop them from the index so the plate's next detection opens a new one
+            closed = db.query(AccessSession.id, AccessSession.plate_number) \
+                .filter(AccessSession.id.in_(list(dirty)), AccessSession.status != "active").all()
+            for session_id, plate in closed:
+                index.discard(plate, session_id)
+        return len(dirty)
+    finally:
+        db.close()
+
+
+def _close_sessions(db, now, *conditions):
+    """
+    Mark matching active sessions exited (keeping last_seen) and return their rows, for the
+    session_exited events and the exit/dwell rollups. Uses UPDATE ... RETURNING where the
+    backend has it.
+    """
+    columns = (sessions_table.c.id, sessions_table.c.plate_number, sessions_table.c.entry_time, sessions_table.c.last_seen,
+               sessions_table.c.category, sessions_table.c.entry_camera_id)
+    stmt = sessions_table.update() \
+        .where(sessions_table.c.status == "active", *conditions) \
+        .values(status="exited", exit_time=now, last_seen=sessions_table.c.last_seen)
+    if getattr(db.bind.dialect, "update_returning", False):
+        return db.execute(stmt.returning(*columns)).fetchall()
+    rows = db.execute(sessions_table.select().with_only_columns(*columns)
+                      .where(sessions_table.c.status == "active", *conditions)).fetchall()
+    if rows:
+        db.execute(stmt.where(sessions_table.c.id.in_([r.id for r in rows])))
+    return rows
+
+
+def _publish_exits(rows, now):
+    for row in rows:
+        publish("session_exited", {"session_id": row.id, "plate": row.plate_number, "exit_time": now})
+
+
+def sweep_sessions(grace_seconds=0):
+    """
+    Mark sessions as exited if last_seen older than timeout + grace_seconds. The grace leaves
+    room for refreshes other workers have not flushed yet, as in sweep_stale_sessions.
+    """
+    flush_last_seen()
+    db = SessionLocal()
+    try:
+        _ensure_index(db)
+        now = datetime.utcnow()
+        threshold = now - timedelta(seconds=ACTIVE_TIMEOUT + grace_seconds)
+        expired = index.pop_expired(now - timedelta(seconds=grace_seconds))
+        if not expired:
+            return 0
+        # conditional on last_seen so a refresh written by another worker keeps the session open
+        rows = _close_sessions(db, now, sessions_table.c.id.in_([sid for _, sid, _ in expired]),
+                               sessions_table.c.last_seen <= threshold)
+        record_exits(db, rows, now)
+        db.commit()
+        # a request thread may have re-adopted one of these between pop_expired and the UPDATE
+        for row in rows:
+            index.discard(row.plate_number, row.id)
+        _publish_exits(rows, now)
+        return len(rows)
     finally:
         db.close()
 
-def sweep_sessions():
-    """Mark sessions as exited if last_seen older than timeout"""
+
+def sweep_stale_sessions(grace_seconds=0):
+    """
+    Close every active session past its timeout, including ones opened by other workers
+    (or a crashed one) that this process' index never saw. Idempotent conditional UPDATE,
+    so several workers running it concurrently is safe; grace_seconds leaves room for
+    workers that have refreshes not yet flushed.
+    """
     db = SessionLocal()
     try:
-        threshold = datetime.utcnow() - timedelta(seconds=ACTIVE_TIMEOUT)
-        active_sessions = db.query(AccessSession).filter(AccessSession.status == "active").all()
-        for s in active_sessions:
-            if s.last_seen < threshold:
-                s.exit_time = datetime.utcnow()
-                s.status = "exited"
-                db.add(s)
+        now = datetime.utcnow()
+        threshold = now - timedelta(seconds=ACTIVE_TIMEOUT + grace_seconds)
+        rows = _close_sessions(db, now, sessions_table.c.last_seen <= threshold)
+        record_exits(db, rows, now)
         db.commit()
+        _publish_exits(rows, now)
+        return len(rows)
     finally:
         db.close()
@@ -0,0 +1,234 @@
+"""
+Multi-camera detection supervisor.
+
+    CAMERAS='gate1=0,gate2=rtsp://10.0.0.5/stream,replay=/data/gate.mp4' python -m detection.supervisor
+
+CAMERAS is either "id=source" pairs separated by commas or a JSON list of
+{"id": ..., "source": ..., "roi": [x1, y1, x2, y2]} objects (roi optional, as frame fractions). Each camera gets its own worker process running
+run_detection.run_camera; crashed workers are restarted with exponential backoff.
+With the "fork" start method the detector and OCR models are loaded once in the
+supervisor and shared copy-on-write by every worker.
+
+SUPERVISOR_MODE=threads runs every camera as a thread of one process instead; the cameras
+then share a single detector through detection.batch_scheduler, so frames from several
+cameras go through one batched inference call.
+"""
+import json
+import multiprocessing as mp
+import signal
+import sys
+import time
+from utils.config import settings
+from utils.logger import get_logger
+
+logger = get_logger()
+
+RESTART_BACKOFF_MAX = 60.0
+STABLE_AFTER_SECONDS = 60.0
+
+# models loaded in the parent before forking; workers reuse them
+_shared_detector = None
+
+
+def parse_cameras(raw=None):
+    """returns [{"id": str, "source": int | str, "roi": optional}]"""
+    raw = (raw if raw is not None else settings.CAMERAS).strip()
+    if not raw:
+        return []
+    if raw.startswith("["):
+        cams = json.loads(raw)
+    else:
+        cams = []
+        for i, part in enumerate(p.strip() for p in raw.split(",") if p.strip()):
+            cam_id, sep, source = part.partition("=")
+            if not sep:
+                cam_id, source = f"cam{i}", part
+            cams.append({"id": cam_id.strip(), "source": source.strip()})
+    for cam in cams:
+        src = cam["source"]
+        if isinstance(src, str) and src.isdigit():
+            cam["source"] = int(src)
+    return cams
+
+
+def preload_models():
+    """Load the detector and OCR reader once so forked workers share the weights."""
+    global _shared_detector
+    from detection.detector import PlateDetector
+    _shared_detector = PlateDetector()
+    _shared_detector.warm_up()
+    from detection.ocr import warm_up
+    try:
+        warm_up()
+    except Exception as e:
+        logger.warning("OCR warm-up failed, workers will load it on first use: %s", e)
+
+
+def _is_replay(source):
+    return not isinstance(source, int) and "://" not in str(source)
+
+
+def _terminate(signum, frame):
+    # unwind run_camera (tracker flush, uploads) instead of dying on the spot
+    sys.exit(0)
+
+
+def _camera_worker(camera):
+    from detection.run_detection import run_camera, start_metrics_push
+    from utils.logger import stop_logging
+    signal.signal(signal.SIGTERM, _terminate)
+    pusher = start_metrics_push(camera["id"])
+    ok = True
+    try:
+        ok = run_camera(camera["id"], camera["source"], detector=_shared_detector, roi=camera.get("roi"))
+    finally:
+        # forked workers leave through os._exit, which skips atexit: final push and log drain here
+        if pusher is not None:
+            pusher.stop()
+        stop_logging()
+    # a file replay that finished is a clean exit; a camera that failed to open is not
+    raise SystemExit(0 if ok else 1)
+
+
+class _Worker:
+    def __init__(self, camera):
+        self.camera = camera
+        self.process = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.backoff = 1.0
+        self.next_start = 0.0
+        self.finished = False
+
+
+class Supervisor:
+    def __init__(self, cameras, start_method=None):
+        self.cameras = cameras
+        start_method = start_method or settings.SUPERVISOR_START_METHOD
+        if start_method not in mp.get_all_start_methods():
+            start_method = "spawn"
+        self.ctx = mp.get_context(start_method)
+        self.start_method = start_method
+        self.workers = [_Worker(c) for c in cameras]
+        self._running = False
+
+    def _start(self, w):
+        w.process = self.ctx.Process(target=_camera_worker, args=(w.camera,), name=f"camera-{w.camera['id']}", daemon=False)
+        w.process.start()
+        w.started_at = time.monotonic()
+        logger.info("Started camera %s (pid %s, source %s)", w.camera["id"], w.process.pid, w.camera["source"])
+
+    def _check(self, w, now):
+        if w.finished:
+            return
+        if w.process is None:
+            if now >= w.next_start:
+                self._start(w)
+            return
+        if w.process.is_alive():
+            if now - w.started_at > STABLE_AFTER_SECONDS:
+                w.backoff = 1.0
+            return
+        code = w.process.exitcode
+        w.process = None
+        if code == 0 and _is_replay(w.camera["source"]):
+            logger.info("Camera %s finished replaying %s", w.camera["id"], w.camera["source"])
+            w.finished = True
+            return
+        w.restarts += 1
+        w.next_start = now + w.backoff
+        logger.warning("Camera %s exited with %s, restarting in %.0fs", w.camera["id"], code, w.backoff)
+        w.backoff = min(RESTART_BACKOFF_MAX, w.backoff * 2)
+
+    def run(self):
+        if self.start_method == "fork":
+            preload_models()
+        self._running = True
+        signal.signal(signal.SIGTERM, lambda *_: self.stop())
+        try:
+            while self._running and not all(w.finished for w in self.workers):
+                now = time.monotonic()
+                for w in self.workers:
+                    self._check(w, now)
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def stop(self):
+        self._running = False
+
+    def shutdown(self, timeout=10.0):
+        for w in self.workers:
+            if w.process is not None and w.process.is_alive():
+                w.process.terminate()
+        for w in self.workers:
+            if w.process is not None:
+                w.process.join(timeout)
+
+    def stats(self):
+        return [{
+            "camera_id": w.camera["id"],
+            "pid": w.process.pid if w.process else None,
+            "alive": bool(w.process and w.process.is_alive()),
+            "restarts": w.restarts,
+            "finished": w.finished,
+        } for w in self.workers]
+
+
+def _camera_thread(camera, detector, stop):
+    from detection.run_detection import run_camera
+    backoff = 1.0
+    while not stop.is_set():
+        started = time.monotonic()
+        try:
+            ok = run_camera(camera["id"], camera["source"], detector=detector, roi=camera.get("roi"))
+        except Exception as e:
+            logger.exception("Camera %s crashed: %s", camera["id"], e)
+            ok = False
+        if ok and _is_replay(camera["source"]):
+            logger.info("Camera %s finished replaying %s", camera["id"], camera["source"])
+            return
+        if time.monotonic() - started > STABLE_AFTER_SECONDS:
+            backoff = 1.0
+        logger.warning("Camera %s stopped, restarting in %.0fs", camera["id"], backoff)
+        stop.wait(backoff)
+        backoff = min(RESTART_BACKOFF_MAX, backoff * 2)
+
+
+def run_threaded(cameras, report_interval=30.0):
+    """All cameras in one process, sharing one batched detector."""
+    import threading
+    from detection.detector import PlateDetector
+    from detection.batch_scheduler import BatchScheduler
+    from detection.run_detection import start_metrics_push
+    start_metrics_push("threads")
+    detector = PlateDetector()
+    detector.warm_up()
+    scheduler = BatchScheduler(detector)
+    stop = threading.Event()
+    threads = [threading.Thread(target=_camera_thread, args=(c, scheduler, stop), name=f"camera-{c['id']}", daemon=True) for c in cameras]
+    for t in threads:
+        t.start()
+    try:
+        while any(t.is_alive() for t in threads):
+            time.sleep(report_interval)
+            logger.info("detect-batcher %s", scheduler.stats())
+    except KeyboardInterrupt:
+        stop.set()
+
+
+def main():
+    cameras = parse_cameras()
+    if not cameras:
+        logger.error("No cameras configured (set CAMERAS)")
+        return
+    if settings.SUPERVISOR_MODE == "threads":
+        run_threaded(cameras)
+    else:
+        Supervisor(cameras).run()
+
+
+if __name__ == "__main__":
+    main()
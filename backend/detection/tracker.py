@@ -0,0 +1,206 @@
+import itertools
+import threading
+import time
+from collections import defaultdict
+import numpy as np
+
+
+def iou(a, b):
+    ax1, ay1, ax2, ay2 = a
+    bx1, by1, bx2, by2 = b
+    iw = max(0, min(ax2, bx2) - max(ax1, bx1))
+    ih = max(0, min(ay2, by2) - max(ay1, by1))
+    inter = iw * ih
+    union = (ax2 - ax1) * (ay2 - ay1) + (bx2 - bx1) * (by2 - by1) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def fuse_readings(readings):
+    """
+    Confidence-weighted per-character vote over OCR readings of the same plate.
+    readings: list of (text, confidence). The winning length is picked first, then
+    each position is voted independently, so "ABC-123" x2 + "A8C-123" x1 -> "ABC-123".
+    returns (text, confidence)
+    """
+    readings = [(t, c) for t, c in readings if t]
+    if not readings:
+        return "", 0.0
+    by_len = defaultdict(float)
+    for t, c in readings:
+        by_len[len(t)] += max(c, 1e-3)
+    length = max(by_len, key=by_len.get)
+    same = [(t, max(c, 1e-3)) for t, c in readings if len(t) == length]
+    total = sum(c for _, c in same)
+    chars = []
+    agreement = []
+    for i in range(length):
+        votes = defaultdict(float)
+        for t, c in same:
+            votes[t[i]] += c
+        ch = max(votes, key=votes.get)
+        chars.append(ch)
+        agreement.append(votes[ch] / total)
+    mean_conf = total / len(same)
+    return "".join(chars), float(min(1.0, mean_conf) * (sum(agreement) / length))
+
+
+class Track:
+    def __init__(self, track_id, det, now):
+        self.id = track_id
+        self.bbox = det["bbox"]
+        self.first_seen = now
+        self.last_seen = now
+        self.hits = 1
+        self.ocr_requested = 0
+        self.readings = []
+        self.best_crop = det["crop"]
+        self.best_score = -1.0
+        self.emitted_at = None
+
+
+class PlateTracker:
+    """
+    IoU/centroid tracker over PlateDetector.detect_in_frame output.
+    Each track is OCR'd at most max_ocr times (every ocr_interval hits), the readings are
+    fused by fuse_readings, and a single event is emitted per track: as soon as the OCR budget
+    is spent, or when the track disappears. Tracks that stay in view are re-emitted every
+    refresh_interval seconds so the backend session keeps its last_seen current.
+    update() and add_reading() are thread-safe so detection and OCR can run on different workers.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_centroid_dist=1.0, max_age=1.5, max_ocr=3, ocr_interval=3, refresh_interval=60.0):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_dist = max_centroid_dist
+        self.max_age = max_age
+        self.max_ocr = max_ocr
+        self.ocr_interval = ocr_interval
+        self.refresh_interval = refresh_interval
+        self.tracks = {}
+        self.frames = 0
+        self.detections = 0
+        self.ocr_calls = 0
+        self.events = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _match(self, dets):
+        """Greedy IoU matching, then centroid distance (in track diagonals) for the leftovers."""
+        tracks = list(self.tracks.values())
+        pairs = {}
+        if tracks and dets:
+            scores = np.array([[iou(t.bbox, d["bbox"]) for d in dets] for t in tracks])
+            while True:
+                ti, di = np.unravel_index(np.argmax(scores), scores.shape)
+                if scores[ti, di] < self.iou_threshold:
+                    break
+                pairs[di] = tracks[ti]
+                scores[ti, :] = -1
+                scores[:, di] = -1
+            used = {id(t) for t in pairs.values()}
+            for di, d in enumerate(dets):
+                if di in pairs:
+                    continue
+                cx, cy = (d["bbox"][0] + d["bbox"][2]) / 2.0, (d["bbox"][1] + d["bbox"][3]) / 2.0
+                best, best_dist = None, self.max_centroid_dist
+                for t in tracks:
+                    if id(t) in used:
+                        continue
+                    tx, ty = (t.bbox[0] + t.bbox[2]) / 2.0, (t.bbox[1] + t.bbox[3]) / 2.0
+                    diag = max(1.0, np.hypot(t.bbox[2] - t.bbox[0], t.bbox[3] - t.bbox[1]))
+                    dist = np.hypot(cx - tx, cy - ty) / diag
+                    if dist < best_dist:
+                        best, best_dist = t, dist
+                if best is not None:
+                    pairs[di] = best
+                    used.add(id(best))
+        return pairs
+
+    def update(self, dets, now=None):
+        """
+        dets: list of {bbox, confidence, crop} for one frame
+        returns (ocr_requests, events): ocr_requests is a list of (track_id, det) that should be OCR'd
+        and passed back through add_reading(); events are consolidated plates for finished tracks.
+        """
+        now = time.monotonic() if now is None else now
+        ocr_requests = []
+        events = []
+        with self._lock:
+            self.frames += 1
+            self.detections += len(dets)
+            pairs = self._match(dets)
+            for di, d in enumerate(dets):
+                t = pairs.get(di)
+                if t is None:
+                    t = Track(next(self._ids), d, now)
+                    self.tracks[t.id] = t
+                else:
+                    t.bbox = d["bbox"]
+                    t.last_seen = now
+                    t.hits += 1
+                if t.ocr_requested < self._budget(t) and (t.hits - 1) % self.ocr_interval == 0:
+                    t.ocr_requested += 1
+                    self.ocr_calls += 1
+                    ocr_requests.append((t.id, d))
+                elif t.emitted_at is not None and now - t.emitted_at >= self.refresh_interval:
+                    ev = self._emit(t, now)
+                    if ev:
+                        events.append(ev)
+            for tid in [tid for tid, t in self.tracks.items() if now - t.last_seen > self.max_age]:
+                t = self.tracks.pop(tid)
+                if t.emitted_at is None:
+                    ev = self._emit(t, now)
+                    if ev:
+                        events.append(ev)
+        return ocr_requests, events
+
+    def _budget(self, t):
+        # keep trying past max_ocr (up to twice) while no reading has produced text
+        valid = sum(1 for txt, _ in t.readings if txt)
+        return self.max_ocr if valid else self.max_ocr * 2
+
+    def add_reading(self, track_id, text, confidence, crop=None):
+        """Record an OCR result for a track; returns the consolidated event once the OCR budget is spent."""
+        with self._lock:
+            t = self.tracks.get(track_id)
+            if t is None:
+                return None
+            if text and len(text) >= 3:
+                t.readings.append((text, float(confidence)))
+                if crop is not None and confidence > t.best_score:
+                    t.best_crop, t.best_score = crop, float(confidence)
+            valid = sum(1 for txt, _ in t.readings if txt)
+            if t.emitted_at is None and valid >= self.max_ocr:
+                return self._emit(t, time.monotonic())
+            return None
+
+    def flush(self):
+        """Emit every track that has readings but no event yet (call on shutdown)."""
+        with self._lock:
+            events = [ev for ev in (self._emit(t, time.monotonic()) for t in self.tracks.values() if t.emitted_at is None) if ev]
+            self.tracks.clear()
+        return events
+
+    def _emit(self, t, now):
+        plate, conf = fuse_readings(t.readings)
+        if not plate:
+            return None
+        t.emitted_at = now
+        self.events += 1
+        return {
+            "track_id": t.id,
+            "plate": plate,
+            "confidence": conf,
+            "crop": t.best_crop,
+            "readings": len(t.readings),
+            "hits": t.hits,
+            "duration": t.last_seen - t.first_seen,
+        }
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "detections": self.detections,
+            "active_tracks": len(self.tracks),
+            "ocr_calls": self.ocr_calls,
+            "events": self.events,
+        }
@@ -0,0 +1,61 @@
+import threading
+import time
+from datetime import datetime
+from utils.config import settings
+from utils.logger import get_logger
+
+logger = get_logger()
+
+
+class ModelWarmup:
+    """
+    Loads the configured OCR engine on a background thread at startup, so the app starts
+    serving immediately and the first upload does not pay for model loading. /health reports
+    ready once it is done; uploads that arrive earlier simply load the model themselves.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.error = None
+        self.started_at = None
+        self.seconds = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.started_at = datetime.utcnow()
+        if not settings.MODEL_WARMUP:
+            self.ready = True
+            return
+        self._thread = threading.Thread(target=self._run, name="model-warmup", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        from detection.ocr import warm_up
+        t0 = time.perf_counter()
+        try:
+            warm_up()
+            self.ready = True
+            logger.info("OCR engine %s warmed up", settings.OCR_ENGINE)
+        except Exception as e:
+            self.error = str(e)
+            logger.exception("Model warm-up failed: %s", e)
+        finally:
+            self.seconds = round(time.perf_counter() - t0, 3)
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def stats(self):
+        return {
+            "ready": self.ready,
+            "engine": settings.OCR_ENGINE,
+            "error": self.error,
+            "warmup_seconds": self.seconds,
+        }
+
+
+warmup = ModelWarmup()
@@ -0,0 +1,198 @@
+import atexit
+import threading
+import time
+from collections import deque
+from utils.logger import get_logger
+
+logger = get_logger()
+
+
+class WriteBehindBuffer:
+    """
+    Buffers rows in memory and hands them to flush_fn(rows) from a background thread, once
+    batch_size rows are waiting or interval seconds after the last flush, so callers never
+    wait on the write. A failed flush keeps the rows and retries; once the same batch has
+    failed max_retries times it is split to find the rows that fail on their own (a
+    constraint violation, bad data), which are logged and set aside in rejected_rows so
+    they stop holding up the rows behind them. Past max_pending the oldest rows are
+    dropped and counted. Rows still buffered when the process dies are
+    lost: stats() reports them as at_risk, stop() (and interpreter exit) flushes them.
+    on_tick, if given, runs on the same thread after every wake-up.
+    """
+
+    def __init__(self, name, flush_fn, batch_size=200, interval=0.25, max_pending=50000, on_tick=None, max_retries=3):
+        self.name = name
+        self.flush_fn = flush_fn
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self.on_tick = on_tick
+        self.max_retries = max_retries
+        self._rows = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self._retrying = False
+        self._head_failures = 0
+        self._atexit = False
+        self.submitted = 0
+        self.written = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.rejected_rows = deque(maxlen=1000)
+        self.last_error = None
+        self.flush_seconds = 0.0
+        self.max_flush_ms = 0.0
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name=f"write-behind-{self.name}", daemon=True)
+            self._thread.start()
+            if not self._atexit:
+                atexit.register(self.stop)
+                self._atexit = True
+
+    def submit(self, rows):
+        if self._thread is None:
+            self.start()
+        with self._cond:
+            self._rows.extend(rows)
+            self.submitted += len(rows)
+            overflow = len(self._rows) - self.max_pending
+            if overflow > 0:
+                for _ in range(overflow):
+                    self._rows.popleft()
+                self.dropped += overflow
+                logger.error("%s write-behind buffer full, dropped %d rows", self.name, overflow)
+            if len(self._rows) >= self.batch_size:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # after a failed flush wait out the interval even with a full batch waiting
+                if not self._stopping and (self._retrying or len(self._rows) < self.batch_size):
+                    self._cond.wait(self.interval)
+                stopping = self._stopping
+            self.flush()
+            if self.on_tick is not None:
+                try:
+                    self.on_tick()
+                except Exception as e:
+                    logger.exception("%s write-behind tick failed: %s", self.name, e)
+            if stopping:
+                return
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of rows written."""
+        with self._flush_lock:
+            total = 0
+            while True:
+                with self._cond:
+                    batch = [self._rows.popleft() for _ in range(min(len(self._rows), self.batch_size))]
+                if not batch:
+                    self._retrying = False
+                    return total
+                t0 = time.perf_counter()
+                try:
+                    self.flush_fn(batch)
+                except Exception as e:
+                    self.failures += 1
+                    self._head_failures += 1
+                    self.last_error = str(e)
+                    logger.exception("%s write-behind flush of %d rows failed: %s", self.name, len(batch), e)
+                    if self._head_failures < self.max_retries or len(batch) == 1:
+                        with self._cond:
+                            self._rows.extendleft(reversed(batch))  # keep order, retry next round
+                        self._retrying = True
+                        return total
+                    written, untried = self._split(batch)
+                    total += written
+                    if untried:
+                        with self._cond:
+                            self._rows.extendleft(reversed(untried))
+                        self._retrying = True
+                        return total
+                    self._head_failures = 0
+                    continue
+                self._head_failures = 0
+                elapsed = time.perf_counter() - t0
+                self.flush_seconds += elapsed
+                self.max_flush_ms = max(self.max_flush_ms, elapsed * 1000.0)
+                self.flushes += 1
+                self.written += len(batch)
+                total += len(batch)
+
+    def _split(self, batch):
+        """
+        Write a batch that keeps failing in halves, down to the single rows that fail on their
+        own, and reject those. Gives up once more attempts fail in a row than the way down to
+        one bad row takes, or when nothing at all can be written: the backend is then failing
+        everything (e.g. the database is down) and rejecting rows would only lose them.
+        Returns (rows written, rows to retry in order).
+        """
+        limit = len(batch).bit_length() + 1
+        mid = len(batch) // 2
+        stack = [batch[mid:], batch[:mid]]
+        written, bad, untried = 0, [], []
+        streak = 1  # the whole batch just failed
+        while stack:
+            rows = stack.pop()
+            if streak > limit:
+                untried.extend(rows)
+                continue
+            try:
+                self.flush_fn(rows)
+            except Exception as e:
+                streak += 1
+                if len(rows) == 1:
+                    bad.append((rows[0], e))
+                else:
+                    mid = len(rows) // 2
+                    stack.extend((rows[mid:], rows[:mid]))
+                continue
+            streak = 0
+            written += len(rows)
+            self.flushes += 1
+        if not written:
+            return 0, batch
+        self.written += written
+        for row, e in bad:
+            logger.error("%s write-behind rejected a row that fails on its own: %s; row=%r", self.name, e, row)
+            self.rejected_rows.append(row)
+        self.rejected += len(bad)
+        return written, untried
+
+    def stop(self, timeout=10.0):
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify()
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+        self.flush()
+        if self._rows:
+            logger.error("%s write-behind stopped with %d rows unwritten; they are lost", self.name, len(self._rows))
+
+    def stats(self):
+        return {
+            "pending": len(self._rows),
+            "at_risk": len(self._rows),  # lost if the process dies now
+            "submitted": self.submitted,
+            "written": self.written,
+            "flushes": self.flushes,
+            "avg_batch": round(self.written / self.flushes, 1) if self.flushes else 0.0,
+            "avg_flush_ms": round(self.flush_seconds / self.flushes * 1000.0, 3) if self.flushes else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 3),
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "last_error": self.last_error,
+        }
@@ -1,9 +1,17 @@
 import os
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from api.routes import router as api_router
 from utils.config import settings
 from utils.logger import get_logger
-from models.base import Base, engine, SessionLocal
+from models.base import engine, SessionLocal, upgrade_schema
+from detection.scheduler import sweeper
+from detection.session_manager import owner_resolver, detection_writer, residents, flush_last_seen
+from detection.excise_lookup import lookup_stats
+from detection.events import bus
+from detection.ocr import ocr_stats
+from detection.warmup import warmup
+from detection.retention import retention
+from utils.metrics import registry, CONTENT_TYPE
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -23,20 +31,50 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
-# create tables
-Base.metadata.create_all(bind=engine)
+# create tables, plus indexes added to tables that already exist
+upgrade_schema(engine)
 
 app.include_router(api_router, prefix="/api")
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "version": "1.0.0"}
+    return {"status": "ok", "version": "1.0.0", "ready": warmup.ready, "models": warmup.stats()}
+
+# queue depths, cache hit rates etc. come straight from the components' stats() at scrape time
+for _name, _stats in (("sweeper", sweeper.stats), ("owner_lookup", lookup_stats), ("owner_queue", owner_resolver.stats),
+                      ("ocr", ocr_stats), ("events", bus.stats), ("residents", residents.stats),
+                      ("detection_writer", detection_writer.stats), ("crop_retention", retention.stats)):
+    registry.add_collector(_name, _stats)
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text exposition of this process's counters, histograms and component stats."""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
 
 @app.on_event("startup")
 def startup():
     logger.info("VehicleSenseAI starting up")
+    if settings.SESSION_SWEEPER_ENABLED:
+        sweeper.start()
+    owner_resolver.start()
+    if settings.DETECTION_WRITE_BEHIND:
+        detection_writer.start()
+    if settings.CROP_RETENTION_DAYS > 0:
+        retention.start()
+    warmup.start()
+
+@app.on_event("shutdown")
+def shutdown():
+    sweeper.stop()
+    retention.stop()
+    owner_resolver.stop()
+    # flush buffered Detection rows before the process goes
+    detection_writer.stop()
+    # and every pending last_seen refresh, or those sessions expire early after a restart
+    flush_last_seen()
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, DateTime, Date, Float
+from .base import Base
+
+# rollups maintained by detection/rollups.py; one row per bucket, so reads cost O(buckets)
+
+class TrafficHourly(Base):
+    __tablename__ = "traffic_hourly"
+    hour = Column(DateTime, primary_key=True)  # start of the UTC hour
+    camera_id = Column(String(128), primary_key=True)
+    category = Column(String(16), primary_key=True)  # resident, visitor
+    entries = Column(Integer, nullable=False, default=0)
+    exits = Column(Integer, nullable=False, default=0)
+    detections = Column(Integer, nullable=False, default=0)
+
+class DwellDaily(Base):
+    __tablename__ = "dwell_daily"
+    day = Column(Date, primary_key=True)  # UTC day the session exited
+    camera_id = Column(String(128), primary_key=True)  # entry camera
+    category = Column(String(16), primary_key=True)
+    le_seconds = Column(Integer, primary_key=True)  # histogram bucket upper bound, -1 = longer than the last bound
+    sessions = Column(Integer, nullable=False, default=0)
+    total_seconds = Column(Float, nullable=False, default=0.0)
@@ -1,8 +1,66 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import declarative_base, sessionmaker
 from utils.config import settings
 
-engine = create_engine(settings.DATABASE_URL, future=True)
+
+def _sqlite_pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    # WAL lets readers run alongside the single writer; NORMAL only fsyncs at checkpoints in WAL mode
+    cur.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cur.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cur.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cur.close()
+
+
+def make_engine(url=None, **overrides):
+    """
+    Engine with per-backend tuning:
+    - sqlite: journal mode, synchronous and busy_timeout applied on every new connection
+    - others (postgres): pool size/overflow/pre-ping/recycle from settings, and batched
+      executemany for the bulk insert and last_seen flush paths on psycopg2
+    """
+    url = make_url(url or settings.DATABASE_URL)
+    kwargs = {"future": True}
+    if url.get_backend_name() == "sqlite":
+        kwargs["connect_args"] = {"timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000.0, "check_same_thread": False}
+        kwargs.update(overrides)
+        eng = create_engine(url, **kwargs)
+        if url.database and url.database != ":memory:":
+            event.listen(eng, "connect", _sqlite_pragmas)
+        return eng
+    kwargs.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    )
+    if url.get_backend_name() == "postgresql" and url.get_driver_name() == "psycopg2":
+        kwargs["executemany_mode"] = "values_plus_batch"
+    kwargs.update(overrides)
+    return create_engine(url, **kwargs)
+
+
+engine = make_engine()
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
 Base = declarative_base()
+
+
+def upgrade_schema(bind=None):
+    """
+    create_all only creates missing tables; add the nullable columns and indexes declared
+    since an existing database was created.
+    """
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+    insp = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        existing = {c["name"] for c in insp.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                with bind.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(bind.dialect)}"))
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Index
 from sqlalchemy.sql import func
 from .base import Base
 
@@ -11,3 +11,11 @@ class Detection(Base):
     detection_confidence = Column(Float)
     image_path = Column(String(512))
     camera_id = Column(String(128), default="cam0")
+
+    __table_args__ = (
+        # keyset pages over (timestamp, id), optionally within one camera or session
+        Index("ix_detections_timestamp_id", "timestamp", "id"),
+        Index("ix_detections_camera_timestamp_id", "camera_id", "timestamp", "id"),
+        Index("ix_detections_session_timestamp", "session_id", "timestamp"),
+        Index("ix_detections_ocr_text", "ocr_text"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from .base import Base
 
@@ -11,3 +11,13 @@ class AccessSession(Base):
     exit_time = Column(DateTime, nullable=True)
     status = Column(String(32), default="active")  # active, exited
     owner_id = Column(Integer, ForeignKey("owner_cache.id"), nullable=True)
+    category = Column(String(16), default="visitor")  # resident, visitor
+    resident_id = Column(Integer, ForeignKey("residents.id"), nullable=True)
+    entry_camera_id = Column(String(128), nullable=True)  # camera of the first detection
+
+    __table_args__ = (
+        # keyset pages over (last_seen, id), optionally within one status
+        Index("ix_access_sessions_last_seen_id", "last_seen", "id"),
+        Index("ix_access_sessions_status_last_seen_id", "status", "last_seen", "id"),
+        Index("ix_access_sessions_plate_status", "plate_number", "status"),
+    )
@@ -3,11 +3,84 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./vehiclesense.db"
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+    DB_POOL_RECYCLE_SECONDS: int = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+    DB_POOL_TIMEOUT_SECONDS: float = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
     EXCISE_LOOKUP_BASE_URL: str = os.getenv("EXCISE_LOOKUP_BASE_URL", "")
+    EXCISE_MAX_CONCURRENCY: int = int(os.getenv("EXCISE_MAX_CONCURRENCY", "4"))
+    EXCISE_RATE_LIMIT_PER_SECOND: float = float(os.getenv("EXCISE_RATE_LIMIT_PER_SECOND", "5"))
+    EXCISE_RETRIES: int = int(os.getenv("EXCISE_RETRIES", "2"))
+    EXCISE_BACKOFF_SECONDS: float = float(os.getenv("EXCISE_BACKOFF_SECONDS", "0.5"))
+    EXCISE_TIMEOUT_SECONDS: float = float(os.getenv("EXCISE_TIMEOUT_SECONDS", "8"))
+    EXCISE_BREAKER_THRESHOLD: int = int(os.getenv("EXCISE_BREAKER_THRESHOLD", "5"))
+    EXCISE_BREAKER_COOLDOWN_SECONDS: float = float(os.getenv("EXCISE_BREAKER_COOLDOWN_SECONDS", "30"))
     OCR_ENGINE: str = os.getenv("OCR_ENGINE", "easyocr")
+    MODEL_WARMUP: bool = os.getenv("MODEL_WARMUP", "1") == "1"
+    # off by default: tesseract per crop only pays off where a replay shows a net gain
+    OCR_FAST_PATH: bool = os.getenv("OCR_FAST_PATH", "0") == "1"
+    OCR_FAST_WORKERS: int = int(os.getenv("OCR_FAST_WORKERS", "4"))
+    OCR_FAST_MIN_CONFIDENCE: float = float(os.getenv("OCR_FAST_MIN_CONFIDENCE", "0.6"))
+    OCR_CANONICAL_HEIGHT: int = int(os.getenv("OCR_CANONICAL_HEIGHT", "48"))
+    # plate templates (L letter, D digit, A either), see detection/plate_format.py
+    PLATE_FORMATS: str = os.getenv("PLATE_FORMATS", "PK:LLL-DDDD,PK:LLL-DDD,PK:LL-DDDD,PK:LL-DDD,PK:LLL-DD-DDDD")
     DETECTION_MODEL_PATH: str = os.getenv("DETECTION_MODEL_PATH", "")
+    DETECTION_BACKEND: str = os.getenv("DETECTION_BACKEND", "auto")  # auto | onnx | yolo | cascade
+    DETECTION_THREADS: int = int(os.getenv("DETECTION_THREADS", "0"))  # 0 = library default
+    DETECTION_ONNX_INT8: bool = os.getenv("DETECTION_ONNX_INT8", "0") == "1"
+    DETECTION_CONF_THRESHOLD: float = float(os.getenv("DETECTION_CONF_THRESHOLD", "0.25"))
+    DETECTION_IOU_THRESHOLD: float = float(os.getenv("DETECTION_IOU_THRESHOLD", "0.45"))
+    DETECTION_INPUT_SIZE: int = int(os.getenv("DETECTION_INPUT_SIZE", "640"))
+    DETECTION_BATCH_SIZE: int = int(os.getenv("DETECTION_BATCH_SIZE", "8"))
+    DETECTION_BATCH_WAIT_MS: float = float(os.getenv("DETECTION_BATCH_WAIT_MS", "10"))
+    CAMERAS: str = os.getenv("CAMERAS", "")  # "id=source,..." or JSON list, see detection/supervisor.py
+    SUPERVISOR_MODE: str = os.getenv("SUPERVISOR_MODE", "process")  # process | threads
+    SUPERVISOR_START_METHOD: str = os.getenv("SUPERVISOR_START_METHOD", "fork")
+    EVENT_HISTORY_SIZE: int = int(os.getenv("EVENT_HISTORY_SIZE", "1000"))
+    EVENT_CLIENT_BUFFER: int = int(os.getenv("EVENT_CLIENT_BUFFER", "256"))
+    EVENT_HEARTBEAT_SECONDS: float = float(os.getenv("EVENT_HEARTBEAT_SECONDS", "15"))
+    PAGE_DEFAULT_LIMIT: int = int(os.getenv("PAGE_DEFAULT_LIMIT", "100"))
+    PAGE_MAX_LIMIT: int = int(os.getenv("PAGE_MAX_LIMIT", "500"))
+    RESIDENT_MATCH_MAX_DISTANCE: int = int(os.getenv("RESIDENT_MATCH_MAX_DISTANCE", "1"))
+    RESIDENT_FUZZY_IS_RESIDENT: bool = os.getenv("RESIDENT_FUZZY_IS_RESIDENT", "0") == "1"  # fuzzy hits stay visitors
     ACTIVE_SESSION_TIMEOUT_SECONDS: int = int(os.getenv("ACTIVE_SESSION_TIMEOUT_SECONDS", "300"))
+    SESSION_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("SESSION_FLUSH_INTERVAL_SECONDS", "5"))
+    DETECTION_WRITE_BEHIND: bool = os.getenv("DETECTION_WRITE_BEHIND", "1") == "1"
+    DETECTION_FLUSH_ROWS: int = int(os.getenv("DETECTION_FLUSH_ROWS", "200"))
+    DETECTION_FLUSH_INTERVAL_MS: float = float(os.getenv("DETECTION_FLUSH_INTERVAL_MS", "250"))
+    DETECTION_MAX_PENDING: int = int(os.getenv("DETECTION_MAX_PENDING", "50000"))
+    DWELL_BUCKETS_SECONDS: str = os.getenv("DWELL_BUCKETS_SECONDS", "60,300,900,1800,3600,7200,14400,28800,86400")
+    SESSION_SWEEPER_ENABLED: bool = os.getenv("SESSION_SWEEPER_ENABLED", "1") == "1"
+    SESSION_SWEEP_INTERVAL_SECONDS: float = float(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "5"))
+    SESSION_FULL_SWEEP_INTERVAL_SECONDS: float = float(os.getenv("SESSION_FULL_SWEEP_INTERVAL_SECONDS", "60"))
+    INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", "4"))
+    INGEST_MAX_PENDING: int = int(os.getenv("INGEST_MAX_PENDING", "64"))
+    OWNER_CACHE_SIZE: int = int(os.getenv("OWNER_CACHE_SIZE", "10000"))
+    OWNER_CACHE_TTL_SECONDS: int = int(os.getenv("OWNER_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    OWNER_NEGATIVE_TTL_SECONDS: int = int(os.getenv("OWNER_NEGATIVE_TTL_SECONDS", "300"))
+    OWNER_LOOKUP_WAIT_SECONDS: float = float(os.getenv("OWNER_LOOKUP_WAIT_SECONDS", "10"))
+    OWNER_LOOKUP_WORKERS: int = int(os.getenv("OWNER_LOOKUP_WORKERS", "4"))
+    OWNER_LOOKUP_QUEUE_SIZE: int = int(os.getenv("OWNER_LOOKUP_QUEUE_SIZE", "1000"))
     STATIC_IMAGE_DIR: str = os.getenv("STATIC_IMAGE_DIR", "/app/static/images")
+    # crop storage and retention, see detection/image_store.py and detection/retention.py
+    CROP_SHARDING: bool = os.getenv("CROP_SHARDING", "1") == "1"
+    CROP_FORMAT: str = os.getenv("CROP_FORMAT", "jpg")  # jpg | webp
+    CROP_JPEG_QUALITY: int = int(os.getenv("CROP_JPEG_QUALITY", "85"))
+    CROP_WEBP_QUALITY: int = int(os.getenv("CROP_WEBP_QUALITY", "80"))
+    CROP_THUMB_WIDTH: int = int(os.getenv("CROP_THUMB_WIDTH", "160"))
+    CROP_RETENTION_DAYS: int = int(os.getenv("CROP_RETENTION_DAYS", "30"))  # 0 = keep every crop in place
+    CROP_RETENTION_MODE: str = os.getenv("CROP_RETENTION_MODE", "pack")  # pack | delete
+    CROP_ARCHIVE_RETENTION_DAYS: int = int(os.getenv("CROP_ARCHIVE_RETENTION_DAYS", "0"))  # 0 = keep archives
+    CROP_RETENTION_INTERVAL_SECONDS: float = float(os.getenv("CROP_RETENTION_INTERVAL_SECONDS", "3600"))
     LOG_FILE: str = os.getenv("LOG_FILE", "/app/logs/vehicle_system.log")
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    # Pushgateway for the detection clients, e.g. http://gateway:9091 (empty = no push)
+    METRICS_PUSH_URL: str = os.getenv("METRICS_PUSH_URL", "")
+    METRICS_PUSH_INTERVAL_SECONDS: float = float(os.getenv("METRICS_PUSH_INTERVAL_SECONDS", "15"))
+    METRICS_JOB: str = os.getenv("METRICS_JOB", "vehiclesense_detector")
 
 settings = Settings()
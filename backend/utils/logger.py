@@ -1,15 +1,51 @@
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from .config import settings
 import os
 
+_listener = None
+
+
+def _attach(logger):
+    """
+    Callers only enqueue the record; a listener thread does the file I/O (and rotation),
+    so a slow disk never stalls a detection or request thread.
+    """
+    global _listener
+    os.makedirs(os.path.dirname(settings.LOG_FILE), exist_ok=True)
+    handler = RotatingFileHandler(settings.LOG_FILE, maxBytes=2_000_000, backupCount=3)
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    records = queue.SimpleQueue()
+    _listener = QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    logger.addHandler(QueueHandler(records))
+
+
+def _after_fork():
+    # the listener thread does not survive fork (supervisor workers): give the child its own
+    logger = logging.getLogger("vehicle_system")
+    if _listener is not None and logger.handlers:
+        for h in [h for h in logger.handlers if isinstance(h, QueueHandler)]:
+            logger.removeHandler(h)
+        _attach(logger)
+
+
+def stop_logging():
+    """Write out every queued record and stop the listener thread; runs at exit."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()  # drains what is queued
+        _listener = None
+
+
 def get_logger():
     logger = logging.getLogger("vehicle_system")
-    logger.setLevel(logging.INFO)
+    logger.setLevel(getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO))
     if not logger.handlers:
-        os.makedirs(os.path.dirname(settings.LOG_FILE), exist_ok=True)
-        handler = RotatingFileHandler(settings.LOG_FILE, maxBytes=2_000_000, backupCount=3)
-        fmt = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-        handler.setFormatter(fmt)
-        logger.addHandler(handler)
+        _attach(logger)
+        atexit.register(stop_logging)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_after_fork)
     return logger
@@ -0,0 +1,252 @@
+import bisect
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# latency buckets in seconds: 0.5 ms .. 10 s
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_str(names, values):
+    if not names:
+        return ""
+    pairs = ",".join('%s="%s"' % (n, str(v).replace("\\", "\\\\").replace('"', '\\"')) for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _fmt(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count; inc() takes the label values positionally, in labelnames order."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, value=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _label_str(self.labelnames, k), v) for k, v in items]
+
+
+class Gauge(Counter):
+    """Point-in-time value: set() it, or give fn to read it at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), fn=None):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self):
+        if self.fn is not None:
+            return [(self.name, "", self.fn())]
+        return super().samples()
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram. observe() is a bisect and three additions under a lock, cheap
+    enough for every frame; quantiles are left to whoever scrapes the buckets.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                self._series[labels] = s = [0] * (len(self.buckets) + 1) + [0.0]
+            s[i] += 1
+            s[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *labels)
+
+    def samples(self):
+        with self._lock:
+            series = [(k, list(v)) for k, v in self._series.items()]
+        out = []
+        names = self.labelnames + ("le",)
+        for labels, s in series:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), s[:-1]):
+                cumulative += n
+                out.append((self.name + "_bucket", _label_str(names, labels + (_fmt(bound),)), cumulative))
+            out.append((self.name + "_sum", _label_str(self.labelnames, labels), s[-1]))
+            out.append((self.name + "_count", _label_str(self.labelnames, labels), cumulative))
+        return out
+
+
+class Registry:
+    """
+    Metrics of one process, rendered in the Prometheus text exposition format.
+    Collectors are functions returning a stats() dict (queue depths, cache hit rates, ...):
+    their numeric values are exported as gauges named <prefix>_<collector>_<key> at scrape time,
+    so components that already keep counters need no extra bookkeeping on their hot path.
+    """
+
+    def __init__(self, prefix="vehiclesense"):
+        self.prefix = prefix
+        self._metrics = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing  # module reloads and repeated imports share the series
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(f"{self.prefix}_{name}", help, labelnames))
+
+    def gauge(self, name, help, labelnames=(), fn=None):
+        return self._add(Gauge(f"{self.prefix}_{name}", help, labelnames, fn))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(f"{self.prefix}_{name}", help, labelnames, buckets))
+
+    def add_collector(self, name, fn):
+        with self._lock:
+            self._collectors[name] = fn
+
+    def _collected(self):
+        lines = []
+        for name, fn in list(self._collectors.items()):
+            try:
+                stats = fn()
+            except Exception:
+                continue
+            for key, value in _flatten(stats):
+                metric = re.sub(r"[^a-zA-Z0-9_]", "_", f"{self.prefix}_{name}_{key}")
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {_fmt(value)}")
+        return lines
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for m in metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            for name, labels, value in m.samples():
+                lines.append(f"{name}{labels} {_fmt(value)}")
+        lines.extend(self._collected())
+        return "\n".join(lines) + "\n"
+
+
+def _flatten(stats, prefix=""):
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}_")
+        elif isinstance(value, bool):
+            yield prefix + key, int(value)
+        elif isinstance(value, (int, float)):
+            yield prefix + key, value
+
+
+registry = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# hot-path series shared by the API process and the detection clients
+detection_seconds = registry.histogram("detection_seconds", "process_detections() call duration, per batch")
+detections_total = registry.counter("detections_total", "Detections processed", ("category",))
+db_commit_seconds = registry.histogram("db_commit_seconds", "Database commit duration", ("kind",))
+ocr_seconds = registry.histogram("ocr_seconds", "OCR duration per crop", ("engine",))
+detect_seconds = registry.histogram("detect_seconds", "Plate detector inference per batch", ("backend",))
+owner_lookup_seconds = registry.histogram("owner_lookup_seconds", "Owner lookup duration", ("source",))
+image_write_seconds = registry.histogram("image_write_seconds", "Crop image write duration")
+sweep_seconds = registry.histogram("sweep_seconds", "Session expiry sweep duration", ("kind",))
+upload_seconds = registry.histogram("upload_seconds", "Detection client upload round trip", ("status",))
+
+
+def push(url, job, instance="", timeout=5.0):
+    """
+    PUT this process's metrics to a Prometheus Pushgateway at url (e.g. http://gateway:9091),
+    grouped under job and instance. Returns True on a 2xx answer.
+    """
+    import requests
+    target = f"{url.rstrip('/')}/metrics/job/{job}" + (f"/instance/{instance}" if instance else "")
+    r = requests.put(target, data=registry.render().encode(), headers={"Content-Type": CONTENT_TYPE}, timeout=timeout)
+    return 200 <= r.status_code < 300
+
+
+class MetricsPusher:
+    """Pushes on a daemon thread every interval seconds, and once more on stop()."""
+
+    def __init__(self, url, job, instance="", interval=15.0):
+        self.url = url
+        self.job = job
+        self.instance = instance
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.pushes = 0
+        self.failures = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="metrics-push", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.push_once()
+
+    def push_once(self):
+        try:
+            ok = push(self.url, self.job, self.instance)
+        except Exception:
+            ok = False
+        self.pushes += 1
+        self.failures += not ok
+        return ok
+
+    def stop(self):
+        """Stop pushing, with one final push; later calls (e.g. atexit after an explicit stop) do nothing."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+        self.push_once()